@@ -1,5 +1,7 @@
 import os
 
+import pytest
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 root_dir_content = os.listdir(BASE_DIR)
 PROJECT_DIR_NAME = 'yatube'
@@ -37,3 +39,38 @@ pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
 ]
+
+
+def pytest_configure(config):
+    # Вместо общего файлового кэша — память процесса (см.
+    # core.test_runner). Модули тестов берут кэш уже при сборке.
+    from django.conf import settings
+    from core.test_runner import CACHES
+    settings.CACHES = CACHES
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    # Загруженные в тестах картинки не должны попадать в media проекта,
+    # а миниатюры создаются сразу, без фоновых потоков, которые могли бы
+    # писать во временный каталог во время его удаления.
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.THUMBNAIL_WORKERS = 0
+
+
+@pytest.fixture(autouse=True)
+def static_storage(settings):
+    # collectstatic в тестах не запускается, а рабочее хранилище требует
+    # манифест (см. core.test_runner).
+    from core.test_runner import STATICFILES_STORAGE
+    settings.STATICFILES_STORAGE = STATICFILES_STORAGE
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # Кэш переживает откат базы между тестами, а инвалидация по тегам
+    # выполняется только после фиксации транзакции.
+    from django.conf import settings
+    from django.core.cache import caches
+    for alias in settings.CACHES:
+        caches[alias].clear()
@@ -0,0 +1,312 @@
+from collections import Counter, OrderedDict
+from functools import partial
+from hashlib import md5
+from threading import Lock
+from time import monotonic
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import transaction
+from django.http import Http404
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+
+
+def _tag_key(tag):
+    return f'cache_tag:{tag}'
+
+
+def tag_versions(tags):
+    """Текущие версии тегов одной строкой для ключа кэша.
+
+    Версия тега — случайный токен, который меняется при инвалидации,
+    поэтому все ключи с этим тегом перестают совпадать разом.
+    """
+    keys = [_tag_key(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    missing = {key: uuid4().hex for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return '.'.join(versions[key] for key in keys)
+
+
+def _modified_key(tag):
+    return f'cache_tag_modified:{tag}'
+
+
+def _bump_tags(tags):
+    now = timezone.now()
+    values = {_tag_key(tag): uuid4().hex for tag in tags}
+    values.update({_modified_key(tag): now for tag in tags})
+    cache.set_many(values, None)
+
+
+def invalidate_tags(*tags):
+    """Сбрасывает все записи кэша, помеченные любым из тегов.
+
+    Версии меняются после фиксации транзакции: иначе параллельный
+    запрос успел бы положить в кэш старые строки под новой версией.
+    """
+    transaction.on_commit(partial(_bump_tags, tags))
+
+
+def tags_modified(tags):
+    """Время последней инвалидации любого из тегов или None."""
+    return max(
+        cache.get_many([_modified_key(tag) for tag in tags]).values(),
+        default=None)
+
+
+def get_versioned_many(entries):
+    """Читает записи, сохранённые set_versioned_many, вместе с версиями
+    их тегов одним get_many.
+
+    entries — словарь ключ записи -> теги. Возвращает записи, версия
+    которых совпала с текущими версиями их тегов, и текущие версии
+    по ключам.
+    """
+    tag_keys = {_tag_key(tag) for tags in entries.values() for tag in tags}
+    found = cache.get_many([*entries, *tag_keys])
+    missing = {key: uuid4().hex for key in tag_keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    versions = {
+        key: '.'.join(found[_tag_key(tag)] for tag in tags)
+        for key, tags in entries.items()}
+    hits = {
+        key: found[key][1] for key in entries
+        if key in found and found[key][0] == versions[key]}
+    return hits, versions
+
+
+def set_versioned_many(values, versions, timeout):
+    """Сохраняет записи с версиями, полученными из get_versioned_many."""
+    cache.set_many(
+        {key: (versions[key], value) for key, value in values.items()},
+        timeout)
+
+
+class UserLRUCache:
+    """Кэш фрагментов по пользователям с LRU-вытеснением внутри каждого.
+
+    У пользователя хранится не больше USER_CACHE_MAX_ENTRIES записей
+    и USER_CACHE_MAX_BYTES байт, поэтому одни тяжёлые ленты не вытесняют
+    всех остальных. Общий объём ограничен MAX_ENTRIES бэкенда alias.
+    Индекс пользователя несёт версию, и сброс меняет её, так что
+    записи, потерянные индексом при гонке, тоже перестают читаться.
+    """
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+        self.alias = alias
+
+    def _index_key(self, owner):
+        return f'user_lru:{self.alias}:{owner}'
+
+    def _entry_key(self, owner, version, key):
+        digest = md5(force_bytes(key)).hexdigest()
+        return f'user_lru:{self.alias}:{owner}:{version}:{digest}'
+
+    def _new_index(self):
+        return {'version': uuid4().hex, 'entries': OrderedDict()}
+
+    def get(self, owner, key):
+        index = self.cache.get(self._index_key(owner))
+        if index is None or key not in index['entries']:
+            return None
+        value = self.cache.get(
+            self._entry_key(owner, index['version'], key))
+        if value is None:
+            del index['entries'][key]
+        else:
+            index['entries'].move_to_end(key)
+        self.cache.set(
+            self._index_key(owner), index, settings.USER_CACHE_TIMEOUT)
+        return value
+
+    def set(self, owner, key, value):
+        index = self.cache.get(self._index_key(owner)) or self._new_index()
+        entries = index['entries']
+        entries[key] = len(value)
+        entries.move_to_end(key)
+        evicted = []
+        while len(entries) > 1 and (
+                len(entries) > settings.USER_CACHE_MAX_ENTRIES
+                or sum(entries.values()) > settings.USER_CACHE_MAX_BYTES):
+            evicted.append(self._entry_key(
+                owner, index['version'], entries.popitem(last=False)[0]))
+        self.cache.delete_many(evicted)
+        self.cache.set_many({
+            self._entry_key(owner, index['version'], key): value,
+            self._index_key(owner): index,
+        }, settings.USER_CACHE_TIMEOUT)
+
+    def invalidate(self, *owners):
+        self.cache.set_many(
+            {self._index_key(owner): self._new_index() for owner in owners},
+            settings.USER_CACHE_TIMEOUT)
+
+
+class ObjectCache:
+    """Двухуровневый кэш объектов модели по уникальному полю.
+
+    Первый уровень — LRU в памяти процесса на OBJECT_CACHE_LOCAL_SIZE
+    объектов, которому верят OBJECT_CACHE_LOCAL_TIMEOUT секунд без
+    обращения к общему кэшу. Второй — общий кэш Django, где объект
+    хранится вместе с версией модели и читается одним get_many с ней.
+    invalidate_model меняет версию и очищает локальный уровень.
+    Если передан fields, загружаются и кэшируются только эти поля,
+    остальные читаются из базы при обращении.
+    Счётчики попаданий и промахов доступны через stats().
+    """
+    instances = []
+
+    def __init__(self, model, field, fields=None):
+        self.model = model
+        self.field = field
+        self.fields = fields
+        self.name = f'{model._meta.label_lower}:{field}'
+        self.local = OrderedDict()
+        self.lock = Lock()
+        self.counts = Counter()
+        self.instances.append(self)
+
+    @staticmethod
+    def _version_key(model):
+        return f'object_version:{model._meta.label_lower}'
+
+    def _key(self, value):
+        return f'object:{self.name}:{md5(force_bytes(value)).hexdigest()}'
+
+    def _get_local(self, value):
+        with self.lock:
+            entry = self.local.get(value)
+            if entry is None or entry[0] < monotonic():
+                return False, None
+            self.local.move_to_end(value)
+        if entry[1] is None:
+            return True, None
+        # Каждый запрос получает свой экземпляр, чтобы связанные объекты,
+        # загруженные одним view, не попадали в кэш процесса.
+        return True, self.model.from_db(*entry[1])
+
+    def _set_local(self, value, obj):
+        timeout = settings.OBJECT_CACHE_LOCAL_TIMEOUT
+        state = None
+        if obj is None:
+            timeout = min(timeout, settings.NEGATIVE_CACHE_TIMEOUT)
+        else:
+            deferred = obj.get_deferred_fields()
+            names = [
+                field.attname for field in self.model._meta.concrete_fields
+                if field.attname not in deferred]
+            state = (
+                obj._state.db, names,
+                [getattr(obj, name) for name in names])
+        with self.lock:
+            self.local[value] = (monotonic() + timeout, state)
+            self.local.move_to_end(value)
+            while len(self.local) > settings.OBJECT_CACHE_LOCAL_SIZE:
+                self.local.popitem(last=False)
+
+    def _found(self, obj):
+        if obj is None:
+            self.counts['negative'] += 1
+            raise self.model.DoesNotExist(
+                f'{self.model._meta.object_name} matching query '
+                'does not exist.')
+        return obj
+
+    def get(self, value):
+        """Объект по значению поля, при отсутствии — DoesNotExist.
+
+        Отсутствие тоже кэшируется на NEGATIVE_CACHE_TIMEOUT секунд,
+        создание объекта модели меняет версию и сбрасывает его.
+        """
+        hit, obj = self._get_local(value)
+        if hit:
+            self.counts['local'] += 1
+            return self._found(obj)
+        key, version_key = self._key(value), self._version_key(self.model)
+        found = cache.get_many([key, version_key])
+        version = found.get(version_key)
+        if version is None:
+            version = uuid4().hex
+            cache.set(version_key, version, None)
+        if key in found and found[key][0] == version:
+            self.counts['shared'] += 1
+            obj = found[key][1]
+        else:
+            self.counts['miss'] += 1
+            try:
+                queryset = self.model._default_manager.all()
+                if self.fields is not None:
+                    queryset = queryset.only(*self.fields)
+                obj = queryset.get(**{self.field: value})
+            except self.model.DoesNotExist:
+                obj = None
+            cache.set(key, (version, obj), (
+                settings.OBJECT_CACHE_TIMEOUT if obj is not None
+                else settings.NEGATIVE_CACHE_TIMEOUT))
+        self._set_local(value, obj)
+        return self._found(obj)
+
+    def get_or_404(self, value):
+        try:
+            return self.get(value)
+        except self.model.DoesNotExist:
+            raise Http404(f'No {self.model._meta.object_name} matches '
+                          'the given query.')
+
+    def stats(self):
+        total = sum(
+            self.counts[name] for name in ('local', 'shared', 'miss'))
+        return {
+            'local_size': len(self.local),
+            'local': self.counts['local'],
+            'shared': self.counts['shared'],
+            'miss': self.counts['miss'],
+            'negative': self.counts['negative'],
+            'hit_rate': (
+                (self.counts['local'] + self.counts['shared']) / total
+                if total else None),
+        }
+
+    @classmethod
+    def invalidate_model(cls, model):
+        """Сбрасывает закэшированные объекты модели во всех кэшах."""
+        cache.set(cls._version_key(model), uuid4().hex, None)
+        for instance in cls.instances:
+            if instance.model is model:
+                with instance.lock:
+                    instance.local.clear()
+
+    @classmethod
+    def all_stats(cls):
+        return {instance.name: instance.stats() for instance in cls.instances}
+
+
+class NegativeCache:
+    """Кэш отсутствующих значений ключа, например id записей.
+
+    Запомненное значение считается отсутствующим NEGATIVE_CACHE_TIMEOUT
+    секунд или до discard при создании объекта с этим ключом.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def _key(self, value):
+        return f'missing:{self.name}:{value}'
+
+    def __contains__(self, value):
+        return cache.get(self._key(value)) is not None
+
+    def add(self, value):
+        cache.set(self._key(value), True, settings.NEGATIVE_CACHE_TIMEOUT)
+
+    def discard(self, value):
+        cache.delete(self._key(value))
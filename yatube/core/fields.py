@@ -0,0 +1,52 @@
+from functools import partial
+
+from django.db.models import signals
+from django.db.models.fields.files import ImageFileDescriptor
+
+
+def _clear_size(field, instance):
+    if field.width_field:
+        setattr(instance, field.width_field, None)
+    if field.height_field:
+        setattr(instance, field.height_field, None)
+
+
+class ImageSizeDescriptor(ImageFileDescriptor):
+    """При присвоении файла, которого нет в хранилище, очищает размеры."""
+
+    def __set__(self, instance, value):
+        try:
+            super().__set__(instance, value)
+        except OSError:
+            _clear_size(self.field, instance)
+
+
+def _update_new_upload(field, instance, **kwargs):
+    # Файл из базы или путь строкой не открываются: размеры уже
+    # в записи или их заполнит команда backfill_image_sizes.
+    if field.attname not in instance.__dict__:
+        return
+    file = getattr(instance, field.attname)
+    if not file or file._committed:
+        return
+    try:
+        field.update_dimension_fields(instance, force=True)
+    except OSError:
+        _clear_size(field, instance)
+
+
+def store_image_size(model, name):
+    """Хранит размеры картинки ImageField в width_field/height_field,
+    не открывая файл при загрузке записи.
+
+    Штатный ImageField читает файл при создании каждого экземпляра,
+    у которого размеры пусты, и падает, если файла нет. Здесь размеры
+    вычисляются только для новой загрузки и при присвоении файла,
+    а недоступный файл оставляет их пустыми.
+    """
+    field = model._meta.get_field(name)
+    signals.post_init.disconnect(field.update_dimension_fields, sender=model)
+    signals.post_init.connect(
+        partial(_update_new_upload, field), sender=model, weak=False,
+        dispatch_uid=f'store_image_size:{model._meta.label}.{name}')
+    setattr(model, name, ImageSizeDescriptor(field))
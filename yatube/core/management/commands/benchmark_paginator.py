@@ -0,0 +1,54 @@
+from timeit import timeit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.template import Context, Template
+from django.template.loader import get_template
+
+FULL_RANGE_TEMPLATE = '''
+{% for i in page_obj.paginator.page_range %}
+  {% if page_obj.number == i %}
+    <li class="page-item active"><span class="page-link">{{ i }}</span></li>
+  {% else %}
+    <li class="page-item">
+      <a class="page-link" href="?page={{ i }}">{{ i }}</a>
+    </li>
+  {% endif %}
+{% endfor %}
+'''
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает время рендера полного списка страниц '
+            'и окна includes/paginator.html для разного числа страниц.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pages', nargs='+', type=int,
+            default=[10, 100, 1000, 10000, 50000])
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        windowed = get_template('includes/paginator.html')
+        full = Template(FULL_RANGE_TEMPLATE)
+        self.stdout.write(
+            f'{"pages":>8} {"full, ms":>10} {"window, ms":>11} '
+            f'{"full, KB":>10} {"window, KB":>11}')
+        for num_pages in options['pages']:
+            per_page = settings.MAX_PAGE_AMOUNT
+            page = Paginator(range(num_pages * per_page), per_page).page(
+                num_pages // 2 or 1)
+            page.next_cursor = page.previous_cursor = None
+            context = {'page_obj': page}
+            results = []
+            for template, ctx in ((full, Context(context)),
+                                  (windowed, context)):
+                seconds = timeit(
+                    lambda: template.render(ctx), number=options['repeat'])
+                size = len(template.render(ctx)) / 1024
+                results.append((seconds / options['repeat'] * 1000, size))
+            (full_ms, full_kb), (window_ms, window_kb) = results
+            self.stdout.write(
+                f'{num_pages:>8} {full_ms:>10.2f} {window_ms:>11.2f} '
+                f'{full_kb:>10.1f} {window_kb:>11.1f}')
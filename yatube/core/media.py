@@ -0,0 +1,161 @@
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from core.storage import content_hash, is_content_addressed
+
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class FileRange:
+    """Отрезок открытого файла для FileResponse.
+
+    Файл уже перемотан на начало отрезка, а fileno() отдаётся как есть,
+    поэтому wsgi.file_wrapper сервера (sendfile в gunicorn) передаёт
+    отрезок без копирования через Python, ограничившись Content-Length.
+    """
+
+    def __init__(self, file_, length):
+        self.file = file_
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def tell(self):
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+def resolve(path):
+    """Абсолютный путь и stat файла под MEDIA_ROOT.
+
+    Скрытые файлы (временные файлы загрузок), каталоги и пути за
+    пределами MEDIA_ROOT дают 404.
+    """
+    if any(part.startswith('.') for part in path.split('/')):
+        raise Http404
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        file_stat = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError, ValueError):
+        raise Http404
+    if not stat.S_ISREG(file_stat.st_mode):
+        raise Http404
+    return full_path, file_stat
+
+
+def etag(path, file_stat):
+    """Хеш содержимого для файлов с именем по хешу, иначе время
+    изменения и размер, как у nginx.
+    """
+    digest = content_hash(path)
+    if digest is not None:
+        return f'"{digest}"'
+    return f'"{int(file_stat.st_mtime):x}-{file_stat.st_size:x}"'
+
+
+def byte_range(request, tag, size):
+    """Отрезок (начало, конец) из заголовка Range или None для всего
+    файла. ValueError, если отрезок за пределами файла.
+
+    Поддерживается один отрезок; If-Range с другим ETag отдаёт весь
+    файл.
+    """
+    header = request.META.get('HTTP_RANGE', '')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    match = RANGE.match(header)
+    if not match or if_range is not None and if_range != tag:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        raise ValueError(header)
+    return start, end
+
+
+def cache_headers(response, path, tag, file_stat):
+    response['ETag'] = tag
+    response['Last-Modified'] = http_date(file_stat.st_mtime)
+    response['Accept-Ranges'] = 'bytes'
+    if is_content_addressed(path):
+        patch_cache_control(
+            response, public=True, max_age=365 * 24 * 60 * 60,
+            immutable=True)
+    else:
+        patch_cache_control(
+            response, public=True, max_age=settings.MEDIA_CACHE_MAX_AGE)
+    return response
+
+
+def media_response(request, path):
+    """Ответ с медиафайлом path в режиме MEDIA_SERVE_MODE.
+
+    В режимах x-accel-redirect и x-sendfile Django только проверяет
+    путь и условные заголовки, а файл с отрезками Range отдаёт
+    фронт-сервер. В режиме python файл отдаёт FileResponse.
+    """
+    full_path, file_stat = resolve(path)
+    tag = etag(path, file_stat)
+    response = get_conditional_response(
+        request, etag=tag, last_modified=int(file_stat.st_mtime))
+    if response is not None:
+        return cache_headers(response, path, tag, file_stat)
+    content_type = (
+        mimetypes.guess_type(full_path)[0] or 'application/octet-stream')
+    mode = settings.MEDIA_SERVE_MODE
+    if mode == 'x-accel-redirect':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = quote(
+            f'{settings.MEDIA_ACCEL_PREFIX}{path}')
+    elif mode == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = full_path
+    else:
+        try:
+            requested = byte_range(request, tag, file_stat.st_size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{file_stat.st_size}'
+            return response
+        response = _file_response(
+            full_path, requested, file_stat.st_size, content_type)
+    return cache_headers(response, path, tag, file_stat)
+
+
+def _file_response(full_path, requested, size, content_type):
+    file_ = open(full_path, 'rb')
+    if requested is None:
+        return FileResponse(file_, content_type=content_type)
+    start, end = requested
+    file_.seek(start)
+    response = FileResponse(
+        FileRange(file_, end - start + 1), status=206,
+        content_type=content_type)
+    response['Content-Length'] = end - start + 1
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
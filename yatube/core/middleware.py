@@ -0,0 +1,58 @@
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import Resolver404, resolve
+from django.utils.cache import get_conditional_response
+from django.utils.encoding import force_bytes
+from django.utils.http import parse_http_date_safe
+
+from core.cache import tag_versions
+
+
+class AnonymousPageCacheMiddleware:
+    """Кэш целых страниц для гостей без cookie сессии.
+
+    Стоит в начале MIDDLEWARE, поэтому при попадании не запускаются
+    сессии, аутентификация и view. Кэшируются GET-запросы к view из
+    settings.PAGE_CACHE_VIEWS, ключ — путь со строкой запроса. View
+    отдаёт TemplateResponse с cache_tags в контексте, вместе с ответом
+    сохраняются версии этих тегов, и ответ считается устаревшим, как
+    только сигналы сбросят любой из них. Ответ из кэша проверяется
+    по его ETag и Last-Modified и может стать 304.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self._is_cacheable(request):
+            return self.get_response(request)
+        key = 'page:' + md5(force_bytes(request.get_full_path())).hexdigest()
+        entry = cache.get(key)
+        if entry is not None:
+            tags, versions, response = entry
+            if tag_versions(tags) == versions:
+                return get_conditional_response(
+                    request, etag=response.get('ETag'),
+                    last_modified=parse_http_date_safe(
+                        response.get('Last-Modified', '')),
+                    response=response)
+        response = self.get_response(request)
+        tags = (getattr(response, 'context_data', None) or {}).get(
+            'cache_tags')
+        if (request.method == 'GET' and tags and response.status_code == 200
+                and not response.cookies and not response.streaming):
+            cache.set(key, (tags, tag_versions(tags), response),
+                      settings.PAGE_CACHE_TIMEOUT)
+        return response
+
+    def _is_cacheable(self, request):
+        if (request.method not in ('GET', 'HEAD')
+                or settings.SESSION_COOKIE_NAME in request.COOKIES):
+            return False
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return False
+        return match.view_name in settings.PAGE_CACHE_VIEWS
@@ -0,0 +1,15 @@
+from django.db import models
+
+
+class StoredFile(models.Model):
+    """Число записей, ссылающихся на файл в ContentAddressedStorage."""
+
+    name = models.CharField(max_length=255, primary_key=True)
+    references = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Файл'
+        verbose_name_plural = 'Файлы'
+
+    def __str__(self) -> str:
+        return self.name
@@ -0,0 +1,187 @@
+import gzip
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from sorl import thumbnail
+
+from core.models import StoredFile
+from core.thumbnails import source_file
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CONTENT_ADDRESSED_NAME = re.compile(
+    r'(?:^|/)(?P<prefix>[0-9a-f]{2})/(?P<digest>(?P=prefix)[0-9a-f]{62})'
+    r'\.\w+$')
+
+
+def hashed_name(directory, digest, extension):
+    """Имя файла по SHA-256 его содержимого."""
+    return posixpath.join(
+        directory, digest[:2], f'{digest}{extension.lower()}')
+
+
+def content_hash(name):
+    """SHA-256 из имени, выданного ContentAddressedStorage, или None."""
+    match = CONTENT_ADDRESSED_NAME.search(name)
+    return match and match.group('digest')
+
+
+def is_content_addressed(name):
+    """Имя выдано ContentAddressedStorage, и содержимое по нему
+    никогда не меняется.
+    """
+    return content_hash(name) is not None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Файловое хранилище с именами по SHA-256 содержимого.
+
+    Файл сохраняется как <каталог>/<xx>/<sha256><расширение>, поэтому
+    одинаковые загрузки хранятся одним файлом, а URL можно кэшировать
+    как immutable. Содержимое пишется во временный файл в том же
+    каталоге и хешируется за один проход, затем переименовывается.
+    Перед проверкой, есть ли уже такой файл, строка StoredFile
+    блокируется до конца транзакции (см. reserve).
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Имя определяет содержимое, суффиксы для занятых имён не нужны.
+        return name
+
+    def _save(self, name, content):
+        directory = posixpath.dirname(name)
+        extension = posixpath.splitext(name)[1]
+        full_directory = self.path(directory)
+        os.makedirs(full_directory, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=full_directory, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+            name = hashed_name(directory, digest.hexdigest(), extension)
+            reserve(name)
+            full_path = self.path(name)
+            if os.path.exists(full_path):
+                os.unlink(temp_path)
+            else:
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                os.chmod(temp_path, self.file_permissions_mode or 0o644)
+                os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        return name
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Статика с хешем содержимого в именах и сжатыми копиями.
+
+    collectstatic пишет рядом с каждым текстовым файлом .gz и, если
+    установлен brotli, .br, чтобы фронт-сервер отдавал их без сжатия на
+    лету. URL из манифеста запоминаются в памяти процесса, поэтому
+    {% static %} не разбирает имя заново на каждом запросе. Имя, которого
+    нет в манифесте, — ошибка: без collectstatic фронт-сервер отдал бы
+    файл без хеша с бессрочным кэшированием.
+    """
+
+    compressible = (
+        '.css', '.js', '.svg', '.ico', '.json', '.map', '.txt', '.xml')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._urls = {}
+
+    def url(self, name, force=False):
+        key = name, force, settings.DEBUG
+        try:
+            return self._urls[key]
+        except KeyError:
+            url = self._urls[key] = super().url(name, force)
+            return url
+
+    def post_process(self, paths, dry_run=False, **options):
+        self._urls = {}
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in sorted(set(self.hashed_files.values())):
+            if name.endswith(self.compressible):
+                for compressed in self._compress(name):
+                    yield name, compressed, True
+
+    def _compress(self, name):
+        with self.open(name) as file_:
+            content = file_.read()
+        variants = [('.gz', gzip.compress(content, 9, mtime=0))]
+        if brotli is not None:
+            variants.append(('.br', brotli.compress(content)))
+        for extension, compressed in variants:
+            # Сжатая копия, которая не меньше оригинала, не нужна.
+            if len(compressed) >= len(content):
+                continue
+            if self.exists(name + extension):
+                self.delete(name + extension)
+            yield self._save(name + extension, ContentFile(compressed))
+
+
+def reserve(name):
+    """Блокирует строку StoredFile файла до конца транзакции.
+
+    Пустое обновление берёт блокировку записи, поэтому _collect не удалит
+    файл между проверкой его наличия в _save и вызовом retain: сборка
+    либо ждёт коммита загрузки и видит ссылку, либо успевает удалить
+    файл раньше, и тогда _save запишет его заново.
+    """
+    updated = StoredFile.objects.filter(name=name).update(
+        references=F('references'))
+    if not updated:
+        StoredFile.objects.get_or_create(name=name)
+
+
+def retain(name):
+    """Добавляет ссылку на файл с именем по хешу."""
+    if not is_content_addressed(name):
+        return
+    stored, created = StoredFile.objects.get_or_create(
+        name=name, defaults={'references': 1})
+    if not created:
+        StoredFile.objects.filter(name=name).update(
+            references=F('references') + 1)
+
+
+def release(name):
+    """Убирает ссылку на файл с именем по хешу.
+
+    Файл без ссылок удаляется вместе с миниатюрами после коммита.
+    Файлы со старыми именами, не по хешу, не удаляются никогда.
+    """
+    if not is_content_addressed(name):
+        return
+    StoredFile.objects.filter(name=name, references__gt=0).update(
+        references=F('references') - 1)
+    transaction.on_commit(lambda: _collect(name))
+
+
+def _collect(name):
+    # Строка удаляется раньше файла и в той же транзакции: reserve в
+    # параллельной загрузке ждёт коммита и после него запишет файл заново.
+    with transaction.atomic():
+        deleted, _ = StoredFile.objects.filter(
+            name=name, references=0).delete()
+        if deleted:
+            thumbnail.delete(source_file(name))
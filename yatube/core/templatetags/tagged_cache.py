@@ -0,0 +1,105 @@
+from django import template
+from django.conf import settings
+from django.templatetags.cache import CacheNode
+from django.utils.safestring import mark_safe
+
+from core.cache import (
+    UserLRUCache, get_versioned_many, set_versioned_many, tag_versions)
+
+register = template.Library()
+
+
+class TagCacheNode(CacheNode):
+    def __init__(self, nodelist, expire_time_var, fragment_name, tags_var,
+                 vary_on):
+        super().__init__(
+            nodelist, expire_time_var, fragment_name, vary_on, None)
+        self.tags_var = tags_var
+
+    def render(self, context):
+        tags = self.tags_var.resolve(context)
+        with context.push(cache_tag_versions=tag_versions(tags)):
+            return super().render(context)
+
+
+@register.tag
+def tagcache(parser, token):
+    """Как {% cache %}, но ключ зависит от версий тегов.
+
+    {% tagcache timeout fragment_name tags=cache_tags var1 var2 %}
+    """
+    nodelist = parser.parse(('endtagcache',))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    if len(bits) < 4 or not bits[3].startswith('tags='):
+        raise template.TemplateSyntaxError(
+            f'{bits[0]} ожидает timeout, fragment_name и tags=')
+    vary_on = [parser.compile_filter('cache_tag_versions')]
+    vary_on += [parser.compile_filter(bit) for bit in bits[4:]]
+    return TagCacheNode(
+        nodelist, parser.compile_filter(bits[1]), bits[2],
+        parser.compile_filter(bits[3][len('tags='):]), vary_on)
+
+
+class UserCacheNode(template.Node):
+    def __init__(self, nodelist, alias_var, owner_var, key_var):
+        self.nodelist = nodelist
+        self.alias_var = alias_var
+        self.owner_var = owner_var
+        self.key_var = key_var
+
+    def render(self, context):
+        user_cache = UserLRUCache(self.alias_var.resolve(context))
+        owner = self.owner_var.resolve(context)
+        key = self.key_var.resolve(context)
+        value = user_cache.get(owner, key)
+        if value is None:
+            value = self.nodelist.render(context)
+            user_cache.set(owner, key, value)
+        return value
+
+
+@register.tag
+def usercache(parser, token):
+    """Кэширует фрагмент для одного пользователя в UserLRUCache.
+
+    {% usercache "cache_alias" user.pk key %}
+    """
+    nodelist = parser.parse(('endusercache',))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    if len(bits) != 4:
+        raise template.TemplateSyntaxError(
+            f'{bits[0]} ожидает alias, владельца и ключ')
+    return UserCacheNode(
+        nodelist, *(parser.compile_filter(bit) for bit in bits[1:]))
+
+
+@register.simple_tag(takes_context=True)
+def post_fragments(context, posts, template_name='includes/article.html'):
+    """Отрисованные шаблоном template_name блоки записей.
+
+    Блоки всей страницы читаются из кэша одним get_many вместе с
+    версиями тегов записи, её автора и группы: в блоке есть имя автора
+    и ссылка по slug группы. Шаблон отрисовывается только для промахов.
+
+    {% post_fragments page_obj as articles %}
+    """
+    posts = list(posts)
+    entries = {
+        f'fragment:{template_name}:{post.pk}': (
+            f'post:{post.pk}', f'author:{post.author_id}',
+            *([f'group:{post.group_id}'] if post.group_id else []))
+        for post in posts}
+    fragments, versions = get_versioned_many(entries)
+    missing = {}
+    post_template = context.template.engine.get_template(template_name)
+    for key, post in zip(entries, posts):
+        if key not in fragments:
+            with context.push(post=post):
+                missing[key] = post_template.render(context)
+    if missing:
+        set_versioned_many(
+            missing, versions, settings.POST_FRAGMENT_TIMEOUT)
+        fragments.update(missing)
+    return [mark_safe(fragments[key]) for key in entries]
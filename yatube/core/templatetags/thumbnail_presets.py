@@ -0,0 +1,39 @@
+from django import template
+
+from core.thumbnails import ThumbnailPrefetch
+from core.thumbnails import preset_size as _preset_size
+from core.thumbnails import preset_thumbnail as _preset_thumbnail
+
+register = template.Library()
+
+
+@register.simple_tag
+def preset_thumbnail(file_, preset, prefetched=None):
+    """Готовая миниатюра пресета или None, пока она создаётся.
+
+    {% preset_thumbnail post.image "article" prefetched=thumbnails as im %}
+    """
+    if not file_:
+        return None
+    return _preset_thumbnail(file_, preset, prefetched)
+
+
+@register.simple_tag
+def preset_size(file_, preset):
+    """Ширина и высота миниатюры пресета по сохранённым размерам
+    картинки, например для заглушки.
+
+    {% preset_size post.image "article" as size %}
+    """
+    if not file_:
+        return None
+    return _preset_size(file_, preset)
+
+
+@register.simple_tag
+def prefetch_thumbnails(posts, preset):
+    """Миниатюры пресета для всех записей страницы одним запросом.
+
+    {% prefetch_thumbnails page_obj "article" as thumbnails %}
+    """
+    return ThumbnailPrefetch((post.image for post in posts), preset)
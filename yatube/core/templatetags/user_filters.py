@@ -1,8 +1,15 @@
 from django import template
 
+from core.utils import page_window as _page_window
+
 register = template.Library()
 
 
 @register.filter
 def addclass(field, css):
     return field.as_widget(attrs={'class': css})
+
+
+@register.filter
+def page_window(page):
+    return list(_page_window(page.number, page.paginator.num_pages))
@@ -0,0 +1,34 @@
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'follow_feed': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'follow_feed',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+
+class TestRunner(DiscoverRunner):
+    """Запускает тесты с хранилищем статики без манифеста и кэшем
+    в памяти.
+
+    В тестах collectstatic не выполняется, а рабочее хранилище требует
+    каждое имя из {% static %} в манифесте. Файловый кэш общий для всех
+    запусков и пережил бы тест.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.test_settings = override_settings(
+            STATICFILES_STORAGE=STATICFILES_STORAGE, CACHES=CACHES)
+        self.test_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.test_settings.disable()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,319 @@
+import fcntl
+import logging
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from threading import Lock
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.dispatch import Signal
+from django.utils.functional import cached_property
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend as BaseThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    EMPTY_VALUE, KVStore as BaseKVStore)
+from sorl.thumbnail.models import KVStore as KVStoreModel
+from sorl.thumbnail.parsers import parse_geometry
+
+from core.cache import NegativeCache
+
+logger = logging.getLogger(__name__)
+
+thumbnail_ready = Signal(providing_args=['name'])
+
+_executor = None
+_pending = set()
+_lock = Lock()
+_failed = NegativeCache('thumbnails')
+# Скрытый каталог: serve_media не отдаёт пути с точкой.
+LOCK_DIRECTORY = '.thumbnail-locks'
+
+
+class ThumbnailLocked(Exception):
+    """Миниатюру создаёт другой поток или процесс."""
+
+
+@contextmanager
+def _file_lock(key):
+    """Неблокирующая блокировка flock на файле в LOCK_DIRECTORY под
+    MEDIA_ROOT, общая для всех процессов с этим каталогом.
+
+    Файлов THUMBNAIL_LOCK_FILES, ключ выбирает один из них по crc32,
+    поэтому каталог не растёт с числом миниатюр. Отдаёт False, если
+    блокировку держит другой. Блокировка снимается и при падении
+    процесса, поэтому срок жизни ей не нужен.
+    """
+    directory = os.path.join(settings.MEDIA_ROOT, LOCK_DIRECTORY)
+    os.makedirs(directory, exist_ok=True)
+    slot = zlib.crc32(key.encode()) % settings.THUMBNAIL_LOCK_FILES
+    with open(os.path.join(directory, f'{slot}.lock'), 'a') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class KVStore(BaseKVStore):
+    """KV-хранилище sorl с чтением многих ключей за один запрос."""
+
+    def get_many(self, image_files):
+        """Записи файлов одним get_many кэша и одним запросом к базе
+        для промахов, None для отсутствующих.
+        """
+        keys = [add_prefix(image_file.key) for image_file in image_files]
+        values = self.cache.get_many(keys)
+        missing = [key for key in keys if key not in values]
+        if missing:
+            found = dict(KVStoreModel.objects.filter(
+                key__in=missing).values_list('key', 'value'))
+            fetched = {key: found.get(key, EMPTY_VALUE) for key in missing}
+            self.cache.set_many(
+                fetched, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT)
+            values.update(fetched)
+        return [
+            None if values[key] == EMPTY_VALUE
+            else deserialize_image_file(values[key]) for key in keys]
+
+
+class ThumbnailBackend(BaseThumbnailBackend):
+    """Бэкенд sorl, который умеет отдать готовые миниатюры без генерации."""
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        """Как в sorl, но одну миниатюру создаёт только один процесс.
+
+        Создание идёт под блокировкой файла на исходник и геометрию.
+        Если её держит другой поток или процесс, сразу выбрасывается
+        ThumbnailLocked: страница тем временем покажет заглушку.
+        """
+        thumbnail = self._thumbnail_file(
+            file_, geometry_string, dict(options))
+        cached = default.kvstore.get(thumbnail)
+        if cached:
+            return cached
+        with _file_lock(thumbnail.key) as acquired:
+            if not acquired:
+                raise ThumbnailLocked(thumbnail.name)
+            return super().get_thumbnail(file_, geometry_string, **options)
+
+    def get_cached_thumbnail(self, file_, geometry_string, **options):
+        """Миниатюра из KV-хранилища sorl или None, если её ещё нет."""
+        return self.get_cached_thumbnails(
+            [file_], geometry_string, **options)[0]
+
+    def get_cached_thumbnails(self, files, geometry_string, **options):
+        """Готовые миниатюры файлов одним обращением к KV-хранилищу."""
+        return default.kvstore.get_many([
+            self._thumbnail_file(file_, geometry_string, dict(options))
+            for file_ in files])
+
+    def _thumbnail_file(self, file_, geometry_string, options):
+        source = ImageFile(file_)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+
+class PresetThumbnail:
+    """Готовая миниатюра пресета с вариантами для srcset."""
+
+    def __init__(self, thumbnail, renditions, source_width=None):
+        self.url = thumbnail.url
+        self.width, self.height = thumbnail.size
+        # Варианты шире исходника не добавляют деталей, а при
+        # upscale=False совпадают друг с другом.
+        urls = {}
+        for rendition in renditions:
+            if rendition is not None and (
+                    rendition is thumbnail or not source_width
+                    or rendition.width <= source_width):
+                urls.setdefault(rendition.width, rendition.url)
+        self.srcset = ', '.join(
+            f'{url} {width}w' for width, url in sorted(urls.items()))
+
+
+class ThumbnailPrefetch:
+    """Миниатюры пресета для всех файлов страницы.
+
+    Загружаются со всеми вариантами для srcset одним обращением
+    к KV-хранилищу при первом чтении, поэтому ничего не стоят, если
+    блоки записей взяты из кэша.
+    """
+
+    def __init__(self, files, preset):
+        self.files = [file_ for file_ in files if file_]
+        self.preset = preset
+
+    @cached_property
+    def thumbnails(self):
+        return dict(zip(
+            (file_.name for file_ in self.files),
+            _cached_renditions(self.files, self.preset)))
+
+
+def renditions(preset):
+    """Геометрии и опции вариантов пресета: сам пресет и его копии
+    шириной THUMBNAIL_SRCSET_WIDTHS с теми же пропорциями.
+    """
+    geometry, options = settings.THUMBNAIL_PRESETS[preset]
+    width, height = parse_geometry(geometry)
+    result = [(geometry, options)]
+    for srcset_width in settings.THUMBNAIL_SRCSET_WIDTHS:
+        if srcset_width == width:
+            continue
+        scaled = str(srcset_width)
+        if height is not None:
+            scaled += f'x{round(height * srcset_width / width)}'
+        result.append((scaled, options))
+    return result
+
+
+def _cached_renditions(files, preset):
+    preset_renditions = renditions(preset)
+    thumbnails = default.kvstore.get_many([
+        default.backend._thumbnail_file(file_, geometry, dict(options))
+        for file_ in files for geometry, options in preset_renditions])
+    step = len(preset_renditions)
+    return [thumbnails[start:start + step]
+            for start in range(0, len(thumbnails), step)]
+
+
+def source_size(file_):
+    """Ширина и высота исходника из полей записи или None."""
+    field = getattr(file_, 'field', None)
+    if field is None or not field.width_field or not field.height_field:
+        return None
+    width = getattr(file_.instance, field.width_field)
+    height = getattr(file_.instance, field.height_field)
+    if not width or not height:
+        return None
+    return width, height
+
+
+def preset_size(file_, preset):
+    """Ширина и высота миниатюры пресета без чтения файлов.
+
+    Считается по сохранённым размерам исходника так же, как их
+    вычисляет sorl. None, если размеры исходника неизвестны, а пресет
+    задаёт только одну сторону.
+    """
+    geometry, options = settings.THUMBNAIL_PRESETS[preset]
+    source = source_size(file_)
+    if source is None:
+        width, height = parse_geometry(geometry)
+        if width is None or height is None or not options.get('crop'):
+            return None
+        return width, height
+    width, height = parse_geometry(geometry, source[0] / source[1])
+    factors = (width / source[0], height / source[1])
+    factor = max(factors) if options.get('crop') else min(factors)
+    if not options.get('upscale', True):
+        factor = min(factor, 1)
+    size = round(source[0] * factor), round(source[1] * factor)
+    if options.get('crop'):
+        size = min(size[0], width), min(size[1], height)
+    return size
+
+
+def preset_thumbnail(file_, preset, prefetch=None):
+    """Готовая миниатюра пресета из THUMBNAIL_PRESETS или None.
+
+    Возвращает PresetThumbnail со всеми готовыми вариантами для srcset.
+    Если передан ThumbnailPrefetch того же пресета с этим файлом,
+    миниатюры берутся из него. Если миниатюры нет, после коммита ставит
+    генерацию всех пресетов файла в пул. Файлы, из которых создать
+    миниатюры не удалось, не ставятся повторно NEGATIVE_CACHE_TIMEOUT
+    секунд.
+    """
+    if (isinstance(prefetch, ThumbnailPrefetch) and prefetch.preset == preset
+            and file_.name in prefetch.thumbnails):
+        thumbnails = prefetch.thumbnails[file_.name]
+    else:
+        thumbnails = _cached_renditions([file_], preset)[0]
+    if thumbnails[0] is None:
+        if file_.name not in _failed:
+            transaction.on_commit(lambda: pregenerate(file_.name))
+        return None
+    source = source_size(file_)
+    return PresetThumbnail(
+        thumbnails[0], thumbnails, source and source[0])
+
+
+def source_file(name):
+    """Исходник по имени в хранилище загрузок.
+
+    Для строки sorl берёт THUMBNAIL_STORAGE, а ключи миниатюр зависят
+    от хранилища исходника, поэтому оно указывается явно.
+    """
+    return ImageFile(name, default_storage)
+
+
+def _generate(name):
+    try:
+        for geometry, options in (
+                rendition for preset in settings.THUMBNAIL_PRESETS
+                for rendition in renditions(preset)):
+            thumbnail = default.backend.get_thumbnail(
+                source_file(name), geometry, **options)
+            # Для недоступного исходника sorl только пишет в лог
+            # и не сохраняет миниатюру в KV-хранилище.
+            if default.kvstore.get(thumbnail) is None:
+                _failed.add(name)
+                return
+        thumbnail_ready.send(sender=ThumbnailBackend, name=name)
+    except ThumbnailLocked:
+        # Сигнал о готовности отправит тот, кто держит блокировку.
+        pass
+    except Exception:
+        _failed.add(name)
+        logger.exception('Не удалось создать миниатюры %s', name)
+    finally:
+        with _lock:
+            _pending.discard(name)
+
+
+def _generate_in_worker(name):
+    try:
+        _generate(name)
+    finally:
+        close_old_connections()
+
+
+def pregenerate(name):
+    """Создаёт миниатюры всех THUMBNAIL_PRESETS файла со всеми
+    вариантами для srcset в пуле потоков.
+
+    Повторная постановка файла, который уже в очереди, пропускается.
+    При THUMBNAIL_WORKERS = 0 миниатюры создаются сразу в этом потоке.
+    По готовности отправляется сигнал thumbnail_ready.
+    """
+    global _executor
+    with _lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+        if settings.THUMBNAIL_WORKERS and _executor is None:
+            _executor = ThreadPoolExecutor(
+                settings.THUMBNAIL_WORKERS, thread_name_prefix='thumbnails')
+    if not settings.THUMBNAIL_WORKERS:
+        _generate(name)
+    else:
+        _executor.submit(_generate_in_worker, name)
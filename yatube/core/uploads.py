@@ -0,0 +1,59 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import (
+    StopUpload, TemporaryFileUploadHandler)
+from PIL import Image, ImageOps
+
+
+class LimitedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """Пишет загрузку сразу во временный файл, не больше
+    IMAGE_UPLOAD_MAX_BYTES байт.
+
+    Как только лимит превышен, разбор тела прекращается без дочитывания
+    остатка, а имя поля попадает в request.truncated_uploads, чтобы
+    форма сообщила о слишком большом файле.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.IMAGE_UPLOAD_MAX_BYTES:
+            self.request.truncated_uploads = truncated_uploads(
+                self.request) | {self.field_name}
+            raise StopUpload(connection_reset=True)
+        self.file.write(raw_data)
+
+
+def truncated_uploads(request):
+    """Имена полей, загрузка которых прервана по IMAGE_UPLOAD_MAX_BYTES."""
+    return getattr(request, 'truncated_uploads', frozenset())
+
+
+def reencode_image(upload):
+    """Уменьшает картинку до IMAGE_UPLOAD_MAX_SIDE и пересохраняет в WebP.
+
+    JPEG декодируется сразу в уменьшенном масштабе через draft, поэтому
+    полноразмерный растр в памяти не появляется. Ориентация из EXIF
+    применяется к пикселям, а сами EXIF-данные не сохраняются.
+    """
+    side = settings.IMAGE_UPLOAD_MAX_SIDE
+    upload.seek(0)
+    output = BytesIO()
+    with Image.open(upload) as image:
+        image.draft('RGB', (side, side))
+        image.thumbnail((side, side))
+        ImageOps.exif_transpose(image, in_place=True)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert(
+                'RGBA' if image.mode in ('LA', 'PA') or 'transparency'
+                in image.info else 'RGB')
+        image.save(output, 'WEBP', quality=settings.IMAGE_UPLOAD_QUALITY)
+    name = os.path.splitext(os.path.basename(upload.name))[0]
+    return SimpleUploadedFile(
+        f'{name}.webp', output.getvalue(), content_type='image/webp')
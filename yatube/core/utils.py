@@ -1,7 +1,236 @@
-from django.core.paginator import Paginator
+from django.core.cache import cache
+from django.core.paginator import InvalidPage, Page, Paginator
 from django.conf import settings
+from django.db.models import Q
+from django.http import Http404
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes, force_str
+from django.utils.functional import cached_property
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
 
+# Первичные ключи — знаковые 64-битные целые, больших база не примет.
+MAX_ID = 2 ** 63 - 1
 
-def paginator(page_number, list):
-    paginator = Paginator(list, settings.MAX_PAGE_AMOUNT)
-    return paginator.get_page(page_number)
+
+def encode_cursor(obj, key=('pub_date', 'id')):
+    """Кодирует ключ (pub_date, id) записи в строку для url."""
+    pub_date, pk = (getattr(obj, field) for field in key)
+    return urlsafe_base64_encode(
+        force_bytes(f'{pub_date.isoformat()}|{pk}'))
+
+
+def decode_cursor(cursor):
+    """Раскодирует курсор, для некорректного значения возвращает None."""
+    try:
+        pub_date, pk = force_str(urlsafe_base64_decode(cursor)).split('|')
+        pub_date, pk = parse_datetime(pub_date), int(pk)
+    except (TypeError, ValueError):
+        return None
+    if pub_date is None or not -MAX_ID - 1 <= pk <= MAX_ID:
+        return None
+    return pub_date, pk
+
+
+class FeedCounter:
+    """Количество записей ленты в режиме exact, cached, estimated
+    или counter.
+
+    Режим выбирается по имени ленты (часть ключа до двоеточия)
+    в settings.FEED_COUNT_MODES. В режиме cached значение хранится
+    в кэше и сбрасывается сигналами при изменении записей, в режиме
+    estimated считается не дальше FEED_COUNT_ESTIMATE_LIMIT строк,
+    в режиме counter берётся готовое значение из таблицы счётчиков.
+    """
+
+    def __init__(self, key, mode=None, value=None):
+        self.key = key
+        self.mode = mode or settings.FEED_COUNT_MODES.get(
+            key.split(':')[0], 'exact')
+        self.value = value
+        self.approximate = False
+
+    @staticmethod
+    def cache_key(key):
+        return f'feed_count:{key}'
+
+    @classmethod
+    def invalidate(cls, *keys):
+        cache.delete_many([cls.cache_key(key) for key in keys])
+
+    def count(self, object_list):
+        if self.mode == 'counter' and self.value is not None:
+            return self.value() if callable(self.value) else self.value
+        object_list = object_list.order_by()
+        if self.mode == 'cached':
+            count = cache.get(self.cache_key(self.key))
+            if count is None:
+                count = object_list.count()
+                cache.set(self.cache_key(self.key), count,
+                          settings.FEED_COUNT_TIMEOUT)
+            return count
+        if self.mode == 'estimated':
+            limit = settings.FEED_COUNT_ESTIMATE_LIMIT
+            count = object_list[:limit].count()
+            self.approximate = count >= limit
+            return count
+        return object_list.count()
+
+
+class KeysetPaginator(Paginator):
+    """Пагинатор ленты по ключу (pub_date, id).
+
+    Номерные страницы работают как у обычного Paginator, а страницы
+    по курсору выбираются одним запросом по индексу без COUNT и OFFSET,
+    поэтому стоят одинаково на первой и на десятитысячной странице.
+    Поля ключа можно переопределить через key, например для ленты
+    подписок, где ключом служат (pub_date, post_id).
+    """
+    key = ('pub_date', 'id')
+
+    def __init__(self, object_list, per_page, counter=None, key=None,
+                 **kwargs):
+        self.key = key or self.key
+        super().__init__(
+            object_list.order_by(*(f'-{field}' for field in self.key)),
+            per_page, **kwargs)
+        self.counter = counter
+
+    @cached_property
+    def count(self):
+        if self.counter is None:
+            return self.object_list.count()
+        return self.counter.count(self.object_list)
+
+    @property
+    def count_is_approximate(self):
+        return self.counter is not None and self.counter.approximate
+
+    def get_page(self, number):
+        """Как Paginator.get_page, но при приблизительном количестве
+        номер за последней посчитанной страницей даёт 404: за пределом
+        оценки ленту листают курсоры.
+        """
+        # Признак приблизительности выставляется при подсчёте.
+        if self.count and self.count_is_approximate:
+            try:
+                return self.page(number)
+            except InvalidPage:
+                raise Http404
+        return super().get_page(number)
+
+    def _get_page(self, *args, **kwargs):
+        page = super()._get_page(*args, **kwargs)
+        objects = list(page.object_list)
+        page.object_list = objects
+        page.previous_cursor = (
+            encode_cursor(objects[0], self.key)
+            if objects and page.has_previous() else None)
+        page.next_cursor = (
+            encode_cursor(objects[-1], self.key)
+            if objects and (page.has_next() or self.count_is_approximate)
+            else None)
+        return page
+
+    def keyset_page(self, after=None, before=None):
+        """Возвращает страницу старше курсора after или новее before.
+
+        Без курсора или с некорректным курсором — первая страница,
+        тоже без COUNT. Если новее before меньше per_page записей,
+        возвращаются ровно они, чтобы записи не повторялись.
+        """
+        key = decode_cursor(after or before) if after or before else None
+        date_field, id_field = self.key
+        if key is None:
+            rows = list(self.object_list[:self.per_page + 1])
+            has_newer, has_older = False, len(rows) > self.per_page
+            rows = rows[:self.per_page]
+        elif after:
+            pub_date, pk = key
+            rows = list(self.object_list.filter(
+                Q(**{f'{date_field}__lt': pub_date})
+                | Q(**{date_field: pub_date, f'{id_field}__lt': pk})
+            )[:self.per_page + 1])
+            has_newer, has_older = True, len(rows) > self.per_page
+            rows = rows[:self.per_page]
+        else:
+            pub_date, pk = key
+            rows = list(self.object_list.filter(
+                Q(**{f'{date_field}__gt': pub_date})
+                | Q(**{date_field: pub_date, f'{id_field}__gt': pk})
+            ).reverse()[:self.per_page + 1])
+            if not rows:
+                return self.keyset_page()
+            has_newer, has_older = len(rows) > self.per_page, True
+            rows = rows[:self.per_page][::-1]
+        page = Page(rows, None, self)
+        page.previous_cursor = (
+            encode_cursor(rows[0], self.key) if rows and has_newer else None)
+        page.next_cursor = (
+            encode_cursor(rows[-1], self.key) if rows and has_older else None)
+        return page
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор списков админки: считает не дальше limit строк
+    (по умолчанию ADMIN_COUNT_LIMIT), поэтому COUNT не проходит всю
+    таблицу. Если строк больше, count_is_approximate истинно и count —
+    нижняя граница.
+    """
+
+    def __init__(self, *args, limit=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.limit = limit or settings.ADMIN_COUNT_LIMIT
+
+    @cached_property
+    def counted(self):
+        return self.object_list.order_by()[:self.limit + 1].count()
+
+    @cached_property
+    def count(self):
+        return min(self.counted, self.limit)
+
+    @property
+    def count_is_approximate(self):
+        return self.counted > self.limit
+
+
+def page_window(number, num_pages, on_each_side=2, on_ends=1):
+    """Номера страниц вокруг текущей и по краям, разрывы обозначены None.
+
+    Для 50 000 страниц возвращает десяток элементов, поэтому шаблон
+    пагинатора не зависит от общего количества страниц.
+    """
+    if num_pages <= (on_each_side + on_ends) * 2 + 1:
+        yield from range(1, num_pages + 1)
+        return
+    if number > on_each_side + on_ends + 1:
+        yield from range(1, on_ends + 1)
+        yield None
+        yield from range(number - on_each_side, number + 1)
+    else:
+        yield from range(1, number + 1)
+    if number < num_pages - on_each_side - on_ends:
+        yield from range(number + 1, number + on_each_side + 1)
+        yield None
+        yield from range(num_pages - on_ends + 1, num_pages + 1)
+    else:
+        yield from range(number + 1, num_pages + 1)
+
+
+def paginator(query, list, count_key=None, key=None, count=None):
+    """Возвращает страницу ленты по курсору after/before, а без курсора —
+    первую страницу по ключу. Номерная страница с COUNT и OFFSET
+    строится, только если номер запрошен явно через page.
+
+    Если передан count_key, количество записей берётся из FeedCounter,
+    count — значение счётчика для режима counter или функция, которая
+    его вернёт, когда количество понадобится номерной странице.
+    """
+    paginator = KeysetPaginator(
+        list, settings.MAX_PAGE_AMOUNT,
+        counter=FeedCounter(count_key, value=count) if count_key else None,
+        key=key)
+    after, before = query.get('after'), query.get('before')
+    if after or before or query.get('page') is None:
+        return paginator.keyset_page(after=after, before=before)
+    return paginator.get_page(query.get('page'))
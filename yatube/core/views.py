@@ -1,4 +1,10 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
 from django.shortcuts import render
+from django.views.decorators.http import require_safe
+
+from core.cache import ObjectCache
+from core.media import media_response
 
 
 def page_not_found(request, exception):
@@ -11,3 +17,17 @@ def csrf_failure(request, reason=''):
 
 def fail_500(request):
     return render(request, 'core/500.html')
+
+
+@staff_member_required
+def object_cache_stats(request):
+    """Попадания и промахи кэшей объектов этого процесса."""
+    return JsonResponse(ObjectCache.all_stats())
+
+
+@require_safe
+def serve_media(request, path):
+    """Медиафайлы: путь проверяется здесь, а отдаёт файл фронт-сервер
+    или FileResponse, смотря по MEDIA_SERVE_MODE.
+    """
+    return media_response(request, path)
@@ -1,17 +1,200 @@
-from django.contrib import admin
+import logging
+from datetime import datetime, time
 
+from django import forms
+from django.contrib import admin, messages
+from django.conf import settings
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME, ActionForm
+from django.contrib.admin.views.main import PAGE_VAR
+from django.core.exceptions import ValidationError
+from django.db.models.functions import Substr
+from django.template.response import TemplateResponse
+from django.utils import timezone
+from django.utils.text import Truncator
+
+from core.utils import EstimatedCountPaginator
+from .bulk import delete_comments, delete_follows, move_posts
 from .models import Post, Group, Comment, Follow
+from .search import matching_ids
+
+PREVIEW_LENGTH = 80
+# Столько страниц после текущей пагинатор админки показывает ссылками.
+PAGES_AHEAD = 3
+
+logger = logging.getLogger(__name__)
+
+
+class PostActionForm(ActionForm):
+    group = forms.ModelChoiceField(
+        Group.objects.all(), required=False, label='Группа')
+
+
+class CommentActionForm(ActionForm):
+    before = forms.DateField(
+        required=False, label='Старше',
+        widget=forms.DateInput(attrs={'type': 'date'}))
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """Список без полного COUNT и с началом текста вместо всего текста.
+
+    Строки считаются до ADMIN_COUNT_LIMIT или на несколько страниц дальше
+    текущей, а неточное количество показывается как «N+».
+
+    Поле preview_field в list_display показывается началом текста,
+    обрезанным в базе: полный текст строк списка не читается.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    preview_field = None
+
+    def get_paginator(self, request, queryset, per_page, **kwargs):
+        # Лимит подсчёта растёт вместе с номером страницы, чтобы
+        # следующие страницы за ADMIN_COUNT_LIMIT оставались доступны.
+        try:
+            page_num = int(request.GET.get(PAGE_VAR, 0))
+        except ValueError:
+            page_num = 0
+        limit = max(settings.ADMIN_COUNT_LIMIT,
+                    (page_num + PAGES_AHEAD + 1) * per_page)
+        return self.paginator(queryset, per_page, limit=limit, **kwargs)
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if self.preview_field is None:
+            return queryset
+        return queryset.defer(self.preview_field).annotate(
+            text_preview=Substr(self.preview_field, 1, PREVIEW_LENGTH + 1))
+
+    def text_preview(self, obj):
+        return Truncator(obj.text_preview).chars(PREVIEW_LENGTH)
+    text_preview.short_description = 'Текст'
+
+    def get_list_display(self, request):
+        return tuple(
+            'text_preview' if name == self.preview_field else name
+            for name in super().get_list_display(request))
+
+    def action_value(self, request, name):
+        """Значение поля name формы действия или None, если оно
+        не заполнено или некорректно.
+        """
+        try:
+            return self.action_form.base_fields[name].clean(
+                request.POST.get(name))
+        except ValidationError:
+            return None
+
+    def run_bulk(self, request, operation, queryset, *args):
+        """Выполняет массовую операцию из posts.bulk с записью хода
+        в журнал и сообщает, сколько строк обработано.
+        """
+        def progress(done):
+            logger.info('%s: обработано строк %d', operation.__name__, done)
+        done = operation(queryset, *args, progress=progress)
+        self.message_user(request, f'Обработано строк: {done}.')
+        return done
+
+    def confirm_bulk(self, request, queryset):
+        """Страница подтверждения действия над queryset с числом
+        затронутых строк, как у delete_selected. None, если действие
+        уже подтверждено.
+        """
+        if request.POST.get('post') == 'yes':
+            return None
+        action = request.POST['action']
+        context = {
+            **self.admin_site.each_context(request),
+            'title': getattr(self, action).short_description,
+            'opts': self.model._meta,
+            'count': queryset.count(),
+            'action': action,
+            'selected': request.POST.getlist(ACTION_CHECKBOX_NAME),
+            'select_across': request.POST.get('select_across', '0'),
+            'action_checkbox_name': ACTION_CHECKBOX_NAME,
+        }
+        request.current_app = self.admin_site.name
+        return TemplateResponse(
+            request, 'admin/posts/confirm_bulk_action.html', context)
 
 
 @admin.register(Post)
-class PostAdmin(admin.ModelAdmin):
+class PostAdmin(ScalableAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author', 'group',)
-    list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    autocomplete_fields = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
+    preview_field = 'text'
     empty_value_display = '-пусто-'
+    action_form = PostActionForm
+    actions = ('move_to_group',)
+
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по полнотекстовому индексу вместо LIKE по тексту."""
+        if not search_term.strip():
+            return queryset, False
+        return queryset.filter(pk__in=matching_ids(search_term)), False
+
+    def move_to_group(self, request, queryset):
+        group = self.action_value(request, 'group')
+        if group is None:
+            self.message_user(
+                request, 'Выберите группу для переноса.', messages.WARNING)
+            return
+        self.run_bulk(request, move_posts, queryset, group)
+    move_to_group.short_description = 'Перенести в группу'
+
+
+@admin.register(Group)
+class GroupAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'title', 'slug')
+    search_fields = ('title', 'slug')
+
+
+@admin.register(Comment)
+class CommentAdmin(ScalableAdmin):
+    list_display = ('pk', 'text', 'post', 'author', 'created')
+    list_select_related = ('post', 'author')
+    raw_id_fields = ('post',)
+    autocomplete_fields = ('author',)
+    preview_field = 'text'
+    action_form = CommentActionForm
+    actions = ('purge_authors', 'purge_older')
+
+    def purge_authors(self, request, queryset):
+        author_ids = set(queryset.values_list('author_id', flat=True))
+        comments = Comment.objects.filter(author_id__in=author_ids)
+        response = self.confirm_bulk(request, comments)
+        if response is None:
+            self.run_bulk(request, delete_comments, comments)
+        return response
+    purge_authors.short_description = 'Удалить все комментарии авторов'
+
+    def purge_older(self, request, queryset):
+        before = self.action_value(request, 'before')
+        if before is None:
+            self.message_user(
+                request, 'Укажите дату.', messages.WARNING)
+            return
+        self.run_bulk(request, delete_comments, queryset.filter(
+            created__lt=timezone.make_aware(datetime.combine(
+                before, time.min))))
+    purge_older.short_description = 'Удалить выбранные старше даты'
+
 
+@admin.register(Follow)
+class FollowAdmin(ScalableAdmin):
+    list_display = ('pk', 'user', 'author')
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
+    actions = ('purge_users',)
 
-admin.site.register(Group)
-admin.site.register(Comment)
-admin.site.register(Follow)
+    def purge_users(self, request, queryset):
+        user_ids = set(queryset.values_list('user_id', flat=True))
+        follows = Follow.objects.filter(user_id__in=user_ids)
+        response = self.confirm_bulk(request, follows)
+        if response is None:
+            self.run_bulk(request, delete_follows, follows)
+        return response
+    purge_users.short_description = 'Удалить все подписки пользователей'
@@ -0,0 +1,113 @@
+from collections import Counter, defaultdict
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+
+from core.cache import invalidate_tags
+from core.utils import FeedCounter
+from . import counters
+from .models import Comment, FeedItem, Follow, Post
+from .signals import invalidate_follow_feeds
+
+
+def _batches(queryset):
+    """Id строк queryset пачками по возрастанию первичного ключа."""
+    ids = queryset.order_by('pk').values_list('pk', flat=True)
+    last_pk = 0
+    while True:
+        batch = list(ids.filter(pk__gt=last_pk)[:settings.BULK_BATCH_SIZE])
+        if not batch:
+            return
+        yield batch
+        last_pk = batch[-1]
+
+
+def _run(queryset, process, progress):
+    """Применяет process к строкам queryset пачками по BULK_BATCH_SIZE.
+
+    Каждая пачка — один UPDATE или DELETE по списку id в своей
+    транзакции, без загрузки объектов и сигналов на каждую строку;
+    счётчики и кэш сбрасываются один раз на пачку после её фиксации.
+    progress вызывается после пачки с числом обработанных к этому
+    моменту строк.
+    """
+    done = 0
+    for ids in _batches(queryset):
+        with transaction.atomic():
+            done += process(ids)
+        if progress is not None:
+            progress(done)
+    return done
+
+
+def _delete(model, ids):
+    # Без сборщика удаления: на эти модели никто не ссылается,
+    # а последствия сигналов post_delete применяются на всю пачку.
+    queryset = model.objects.filter(pk__in=ids)
+    return queryset._raw_delete(queryset.db)
+
+
+def _invalidate_posts(rows, *group_ids):
+    """Сбрасывает кэш страниц с записями rows — (id, автор, группа)."""
+    author_ids = {author_id for _, author_id, _ in rows}
+    group_ids = {group_id for _, _, group_id in rows} | set(group_ids)
+    invalidate_tags(
+        'feed:all',
+        *(f'author:{pk}' for pk in author_ids),
+        *(f'post:{pk}' for pk, _, _ in rows),
+        *(f'group:{pk}' for pk in group_ids if pk))
+
+
+def move_posts(queryset, group, progress=None):
+    """Переносит записи queryset в группу group."""
+    def process(ids):
+        rows = list(Post.objects.filter(pk__in=ids).values_list(
+            'pk', 'author_id', 'group_id'))
+        Post.objects.filter(pk__in=ids).update(group=group)
+        counters.on_posts_moved(
+            Counter(group_id for _, _, group_id in rows), group.pk)
+        transaction.on_commit(partial(FeedCounter.invalidate, *(
+            f'group_list:{pk}'
+            for pk in {group_id for _, _, group_id in rows} | {group.pk}
+            if pk)))
+        _invalidate_posts(rows, group.pk)
+        return len(rows)
+    return _run(queryset.exclude(group=group), process, progress)
+
+
+def delete_comments(queryset, progress=None):
+    """Удаляет комментарии queryset."""
+    def process(ids):
+        post_ids = set(Comment.objects.filter(pk__in=ids).values_list(
+            'post_id', flat=True))
+        deleted = _delete(Comment, ids)
+        counters.reconcile_posts(post_ids)
+        _invalidate_posts(list(Post.objects.filter(
+            pk__in=post_ids).values_list('pk', 'author_id', 'group_id')))
+        return deleted
+    return _run(queryset, process, progress)
+
+
+def delete_follows(queryset, progress=None):
+    """Удаляет подписки queryset."""
+    def process(ids):
+        rows = list(Follow.objects.filter(pk__in=ids).values_list(
+            'user_id', 'author_id'))
+        deleted = _delete(Follow, ids)
+        counters.reconcile_users(list(
+            {user_id for user_id, _ in rows}
+            | {author_id for _, author_id in rows}))
+        if settings.FOLLOW_FEED_ENGINE == 'inbox':
+            authors = defaultdict(list)
+            for user_id, author_id in rows:
+                authors[user_id].append(author_id)
+            for user_id, author_ids in authors.items():
+                FeedItem.objects.filter(
+                    user_id=user_id,
+                    post__author_id__in=author_ids).delete()
+        invalidate_follow_feeds(*{user_id for user_id, _ in rows})
+        invalidate_tags(*{
+            f'profile:{pk}' for row in rows for pk in row})
+        return deleted
+    return _run(queryset, process, progress)
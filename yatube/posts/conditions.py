@@ -0,0 +1,92 @@
+from hashlib import md5
+
+from django.db.models import Max
+from django.utils.encoding import force_bytes
+from django.views.decorators.http import condition
+
+from core.cache import tag_versions, tags_modified
+from . import feeds, lookups
+from .models import Comment, Group, Post, User
+
+
+def _last_date(queryset, field='pub_date'):
+    return queryset.order_by().aggregate(last=Max(field))['last']
+
+
+def index_scope(request):
+    return ['feed:all'], [_last_date(Post.objects)]
+
+
+def group_scope(request, slug):
+    try:
+        group_id = lookups.groups.get(slug).pk
+    except Group.DoesNotExist:
+        return None
+    return [f'group:{group_id}'], [
+        _last_date(Post.objects.filter(group_id=group_id))]
+
+
+def profile_scope(request, username):
+    try:
+        author_id = lookups.users.get(username).pk
+    except User.DoesNotExist:
+        return None
+    tags = [f'author:{author_id}', f'profile:{author_id}']
+    if request.user.is_authenticated:
+        tags.append(f'profile:{request.user.pk}')
+    return tags, [_last_date(Post.objects.filter(author_id=author_id))]
+
+
+def post_scope(request, post_id):
+    try:
+        post = lookups.get_post(Post.objects.values(
+            'author_id', 'group_id', 'pub_date'), post_id)
+    except Post.DoesNotExist:
+        return None
+    return [
+        f'post:{post_id}', f'author:{post["author_id"]}',
+        f'group:{post["group_id"]}',
+    ], [
+        post['pub_date'],
+        _last_date(Comment.objects.filter(post_id=post_id), 'created'),
+    ]
+
+
+def follow_scope(request):
+    # Тег ленты подписок сбрасывается новой или удалённой записью
+    # авторов и каждой подпиской, правки записей — тегами авторов.
+    return [f'follow:{request.user.pk}', *(
+        f'author:{pk}' for pk in feeds.followed_author_ids(request.user))], []
+
+
+def conditional_page(scope):
+    """Conditional GET для страницы по её области scope.
+
+    scope(request, *args, **kwargs) возвращает теги страницы и даты
+    последних изменений, взятые агрегатами по индексам, или None, если
+    объекта нет. ETag строится из версий тегов, пользователя и дат,
+    Last-Modified — самая поздняя из дат и времени сброса тегов.
+    На совпадение If-None-Match/If-Modified-Since отвечает 304, не
+    выполняя view.
+    """
+    def version(request, *args, **kwargs):
+        if not hasattr(request, '_page_version'):
+            request._page_version = None, None
+            scope_values = scope(request, *args, **kwargs)
+            if scope_values is not None:
+                tags, dates = scope_values
+                dates = [date for date in dates if date is not None]
+                modified = tags_modified(tags)
+                if modified is not None:
+                    dates.append(modified)
+                last_modified = max(dates, default=None)
+                etag = md5(force_bytes(
+                    f'{request.user.pk}|{tag_versions(tags)}|'
+                    f'{last_modified}')).hexdigest()
+                request._page_version = etag, last_modified
+        return request._page_version
+
+    return condition(
+        etag_func=lambda *args, **kwargs: version(*args, **kwargs)[0],
+        last_modified_func=lambda *args, **kwargs: version(
+            *args, **kwargs)[1])
@@ -0,0 +1,128 @@
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from .models import Follow, Group, Post, UserCounter
+
+USER_FIELDS = ('posts_count', 'followers_count', 'following_count')
+
+
+def _change(queryset, **deltas):
+    return queryset.update(**{
+        field: F(field) + delta if delta > 0
+        else Greatest(F(field) + delta, 0)
+        for field, delta in deltas.items()})
+
+
+def change_user(user_id, **deltas):
+    """Меняет счётчики пользователя на deltas одним UPDATE.
+
+    Если строки счётчиков ещё нет, при увеличении она создаётся
+    пересчётом по базе, а уменьшение пропускается.
+    """
+    changed = _change(UserCounter.objects.filter(user_id=user_id), **deltas)
+    if not changed and all(delta > 0 for delta in deltas.values()):
+        reconcile_users([user_id])
+
+
+def change_group(group_id, delta):
+    if group_id:
+        _change(Group.objects.filter(pk=group_id), posts_count=delta)
+
+
+def change_post(post_id, delta):
+    _change(Post.objects.filter(pk=post_id), comments_count=delta)
+
+
+def user_counter(user):
+    """Счётчики пользователя, при отсутствии строки — пересчитанные."""
+    try:
+        return user.counters
+    except UserCounter.DoesNotExist:
+        reconcile_users([user.pk])
+        return UserCounter.objects.get(pk=user.pk)
+
+
+def _totals(queryset, field, ids):
+    return dict(queryset.filter(**{f'{field}__in': ids}).order_by().values(
+        field).annotate(total=Count('pk')).values_list(field, 'total'))
+
+
+def reconcile_users(user_ids):
+    """Сверяет счётчики пользователей с базой и чинит расхождения.
+
+    Возвращает количество исправленных строк.
+    """
+    totals = (
+        _totals(Post.objects, 'author_id', user_ids),
+        _totals(Follow.objects, 'author_id', user_ids),
+        _totals(Follow.objects, 'user_id', user_ids),
+    )
+    existing = UserCounter.objects.in_bulk(user_ids)
+    created, updated = [], []
+    for user_id in user_ids:
+        values = dict(zip(
+            USER_FIELDS, (total.get(user_id, 0) for total in totals)))
+        counter = existing.get(user_id)
+        if counter is None:
+            created.append(UserCounter(user_id=user_id, **values))
+        elif any(getattr(counter, field) != value
+                 for field, value in values.items()):
+            for field, value in values.items():
+                setattr(counter, field, value)
+            updated.append(counter)
+    UserCounter.objects.bulk_create(created, ignore_conflicts=True)
+    UserCounter.objects.bulk_update(updated, USER_FIELDS)
+    return len(created) + len(updated)
+
+
+def _reconcile_column(model, field, related, ids):
+    rows = model.objects.filter(pk__in=ids).order_by().annotate(
+        total=Count(related)).values_list('pk', field, 'total')
+    updated = [model(pk=pk, **{field: total})
+               for pk, current, total in rows if current != total]
+    model.objects.bulk_update(updated, [field])
+    return len(updated)
+
+
+def reconcile_groups(group_ids):
+    return _reconcile_column(Group, 'posts_count', 'posts', group_ids)
+
+
+def reconcile_posts(post_ids):
+    return _reconcile_column(Post, 'comments_count', 'comments', post_ids)
+
+
+def on_post_created(post):
+    change_user(post.author_id, posts_count=1)
+    change_group(post.group_id, 1)
+
+
+def on_post_moved(post, previous_group_id):
+    change_group(previous_group_id, -1)
+    change_group(post.group_id, 1)
+
+
+def on_post_deleted(post):
+    change_user(post.author_id, posts_count=-1)
+    change_group(post.group_id, -1)
+
+
+def on_posts_moved(previous_counts, group_id):
+    """Переносит счётчики групп для пачки записей.
+
+    previous_counts — сколько записей ушло из каждой группы.
+    """
+    for previous_id, count in previous_counts.items():
+        if previous_id:
+            _change(Group.objects.filter(pk=previous_id), posts_count=-count)
+    _change(Group.objects.filter(pk=group_id),
+            posts_count=sum(previous_counts.values()))
+
+
+def on_comment(comment, delta):
+    change_post(comment.post_id, delta)
+
+
+def on_follow(follow, delta):
+    change_user(follow.author_id, followers_count=delta)
+    change_user(follow.user_id, following_count=delta)
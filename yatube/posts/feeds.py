@@ -0,0 +1,205 @@
+import heapq
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, PageNotAnInteger
+from django.db import transaction
+
+from core.utils import KeysetPaginator, paginator
+from .models import FeedItem, Follow, Post
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _bulk_insert(items):
+    items = iter(items)
+    batch = list(islice(items, settings.FEED_BATCH_SIZE))
+    while batch:
+        FeedItem.objects.bulk_create(batch, ignore_conflicts=True)
+        batch = list(islice(items, settings.FEED_BATCH_SIZE))
+
+
+def fan_out(post):
+    """Раскладывает новую запись в ленты подписчиков автора."""
+    followers = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    _bulk_insert(
+        FeedItem(user_id=user_id, post=post, pub_date=post.pub_date)
+        for user_id in followers.iterator())
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика все записи автора."""
+    posts = Post.objects.filter(
+        author_id=author_id).values_list('id', 'pub_date')
+    _bulk_insert(
+        FeedItem(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for post_id, pub_date in posts.iterator())
+
+
+def remove(user_id, author_id):
+    """Убирает из ленты подписчика записи автора."""
+    FeedItem.objects.filter(
+        user_id=user_id, post__author_id=author_id).delete()
+
+
+def rebuild(user_ids=None):
+    """Пересобирает ленты пользователей с нуля по подпискам."""
+    follows = Follow.objects.order_by('user_id')
+    items = FeedItem.objects.all()
+    if user_ids is not None:
+        follows = follows.filter(user_id__in=user_ids)
+        items = items.filter(user_id__in=user_ids)
+    with transaction.atomic():
+        items.delete()
+        for user_id, author_id in follows.values_list(
+                'user_id', 'author_id').iterator():
+            backfill(user_id, author_id)
+
+
+def check(user_id):
+    """Сверяет ленту пользователя с подписками.
+
+    Возвращает id записей, которых не хватает в ленте, и id лишних.
+    """
+    expected = Post.objects.filter(
+        author__following__user_id=user_id).values_list('id', flat=True)
+    actual = FeedItem.objects.filter(
+        user_id=user_id).values_list('post_id', flat=True)
+    missing = expected.exclude(id__in=actual)
+    extra = actual.exclude(post_id__in=expected)
+    return set(missing), set(extra)
+
+
+def _timeline_key(author_id):
+    return f'timeline:{author_id}'
+
+
+def _timeline_item(pub_date, post_id):
+    return (pub_date - EPOCH) // timedelta(microseconds=1), post_id
+
+
+def _load_timeline(author_id):
+    rows = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id').values_list('pub_date', 'id')
+    items = [_timeline_item(*row)
+             for row in rows[:settings.TIMELINE_LENGTH + 1]]
+    return len(items) <= settings.TIMELINE_LENGTH, items[
+        :settings.TIMELINE_LENGTH]
+
+
+def get_timelines(author_ids):
+    """Возвращает хронологии авторов из кэша, догружая промахи из базы.
+
+    Хронология — это пара (полная ли она, список (время в мкс, id))
+    не длиннее TIMELINE_LENGTH, новые записи первыми.
+    """
+    keys = {_timeline_key(author_id): author_id for author_id in author_ids}
+    timelines = cache.get_many(keys)
+    missing = {}
+    for key, author_id in keys.items():
+        if key not in timelines:
+            missing[key] = timelines[key] = _load_timeline(author_id)
+    if missing:
+        cache.set_many(missing, settings.TIMELINE_TIMEOUT)
+    return list(timelines.values())
+
+
+def push_timeline(post):
+    """Добавляет новую запись в начало хронологии автора. Вызывается
+    после фиксации, поэтому хронология, загруженная из базы после неё,
+    может уже содержать запись.
+    """
+    key = _timeline_key(post.author_id)
+    timeline = cache.get(key)
+    if timeline is None:
+        return
+    complete, items = timeline
+    item = _timeline_item(post.pub_date, post.id)
+    if item in items:
+        return
+    items.insert(0, item)
+    if len(items) > settings.TIMELINE_LENGTH:
+        complete, items = False, items[:settings.TIMELINE_LENGTH]
+    cache.set(key, (complete, items), settings.TIMELINE_TIMEOUT)
+
+
+def drop_timeline(post):
+    cache.delete(_timeline_key(post.author_id))
+
+
+class TimelineCounter:
+    """Количество записей по хронологиям, совместимое с FeedCounter."""
+
+    def __init__(self, timelines):
+        self.total = sum(len(items) for _, items in timelines)
+        self.approximate = not all(complete for complete, _ in timelines)
+
+    def count(self, object_list):
+        return self.total
+
+
+def timeline_page(author_ids, page_number, object_list, counter=None):
+    """Собирает номерную страницу k-way слиянием хронологий авторов.
+
+    Пока конец страницы не дальше TIMELINE_LENGTH, слияние обрезанных
+    хронологий даёт тот же порядок, что и запрос к базе: у пропущенных
+    записей автора впереди уже не меньше TIMELINE_LENGTH его же записей.
+    Для более дальних страниц возвращает None.
+    """
+    try:
+        number = int(page_number or 1)
+    except (TypeError, ValueError):
+        number = 1
+    per_page = settings.MAX_PAGE_AMOUNT
+    if number < 1 or number * per_page > settings.TIMELINE_LENGTH:
+        return None
+    timelines = get_timelines(author_ids)
+    page_paginator = KeysetPaginator(
+        object_list, per_page, counter=counter or TimelineCounter(timelines))
+    try:
+        number = page_paginator.validate_number(number)
+    except (EmptyPage, PageNotAnInteger):
+        number = page_paginator.num_pages
+    merged = heapq.merge(*(items for _, items in timelines), reverse=True)
+    ids = [post_id for _, post_id in islice(
+        merged, (number - 1) * per_page, number * per_page)]
+    posts = object_list.in_bulk(ids)
+    return page_paginator._get_page(
+        [posts[pk] for pk in ids if pk in posts], number, page_paginator)
+
+
+def followed_author_ids(user):
+    """id авторов, на которых подписан user; запрос выполняется один
+    раз на объект пользователя, то есть на запрос."""
+    if not hasattr(user, '_followed_author_ids'):
+        user._followed_author_ids = list(Follow.objects.filter(
+            user=user).values_list('author_id', flat=True))
+    return user._followed_author_ids
+
+
+def follow_page(user, query):
+    """Страница ленты подписок движком из settings.FOLLOW_FEED_ENGINE.
+
+    inbox — материализованная лента FeedItem, timeline — слияние
+    хронологий авторов из кэша с откатом на запрос к базе для дальних
+    страниц и курсоров, orm — запрос к базе через подписки.
+    """
+    engine = settings.FOLLOW_FEED_ENGINE
+    count_key = f'follow_index:{user.pk}'
+    if engine == 'inbox':
+        feed = user.feed_items.select_related('post__group', 'post__author')
+        page = paginator(query, feed, count_key, key=('pub_date', 'post_id'))
+        page.object_list = [item.post for item in page.object_list]
+        return page
+    post_list = Post.objects.filter(
+        author__following__user=user).select_related('group', 'author')
+    if engine == 'timeline' and not (query.get('after')
+                                     or query.get('before')):
+        page = timeline_page(
+            followed_author_ids(user), query.get('page'), post_list)
+        if page is not None:
+            return page
+    return paginator(query, post_list, count_key)
@@ -1,5 +1,9 @@
 from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.template.defaultfilters import filesizeformat
 
+from core.uploads import reencode_image
 from .models import Post, Comment
 
 
@@ -8,6 +12,25 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def __init__(self, *args, truncated=frozenset(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.image_truncated = self.add_prefix('image') in truncated
+
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if self.image_truncated:
+            raise forms.ValidationError(
+                'Файл больше %s.' % filesizeformat(
+                    settings.IMAGE_UPLOAD_MAX_BYTES))
+        if not isinstance(image, UploadedFile):
+            return image
+        width, height = image.image.size
+        if width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+            raise forms.ValidationError(
+                'Картинка больше %d мегапикселей.'
+                % (settings.IMAGE_UPLOAD_MAX_PIXELS // 10 ** 6))
+        return reencode_image(image)
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,35 @@
+from django.http import Http404
+
+from core.cache import NegativeCache, ObjectCache
+from core.utils import MAX_ID
+from .models import Group, Post, User
+
+# Счётчик записей группы меняется с каждой записью, поэтому в кэш
+# не попадает; у пользователей кэшируются только публичные поля.
+groups = ObjectCache(Group, 'slug', ('pk', 'title', 'slug', 'description'))
+users = ObjectCache(
+    User, 'username', ('pk', 'username', 'first_name', 'last_name'))
+missing_posts = NegativeCache('posts.post')
+
+
+def get_post(queryset, post_id):
+    """Запись по id, запоминая отсутствующие id в missing_posts.
+    Id вне диапазона ключей базы считается отсутствующим.
+    """
+    if post_id in missing_posts:
+        raise Post.DoesNotExist
+    if not 0 < post_id <= MAX_ID:
+        missing_posts.add(post_id)
+        raise Post.DoesNotExist
+    try:
+        return queryset.get(pk=post_id)
+    except Post.DoesNotExist:
+        missing_posts.add(post_id)
+        raise
+
+
+def get_post_or_404(queryset, post_id):
+    try:
+        return get_post(queryset, post_id)
+    except Post.DoesNotExist:
+        raise Http404('No Post matches the given query.')
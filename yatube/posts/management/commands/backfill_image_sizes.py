@@ -0,0 +1,38 @@
+from django.core.files.images import get_image_dimensions
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Заполняет ширину и высоту картинок записей, созданных до '
+            'появления этих полей. Читаются только заголовки файлов, '
+            'недоступные файлы пропускаются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        filled = missing = 0
+        posts = Post.objects.exclude(image='').filter(
+            image_width__isnull=True).order_by('pk').only('image')
+        last_pk = 0
+        while True:
+            batch = list(posts.filter(pk__gt=last_pk)[
+                :options['batch_size']])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            for post in batch:
+                try:
+                    with post.image.open() as image:
+                        width, height = get_image_dimensions(image)
+                except OSError:
+                    width = height = None
+                if width is None:
+                    missing += 1
+                    continue
+                Post.objects.filter(pk=post.pk).update(
+                    image_width=width, image_height=height)
+                filled += 1
+        self.stdout.write(f'Заполнено {filled}, недоступно {missing}')
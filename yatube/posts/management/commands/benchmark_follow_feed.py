@@ -0,0 +1,87 @@
+from datetime import timedelta
+from timeit import timeit
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from posts import feeds
+from posts.models import Follow, Post
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает первую страницу ленты подписок через запрос '
+            'к базе и через слияние хронологий авторов. Тестовые данные '
+            'создаются в транзакции и откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--authors', nargs='+', type=int, default=[10, 100, 1000])
+        parser.add_argument('--posts-per-author', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'{"authors":>8} {"orm, ms":>9} {"cold merge, ms":>15} '
+            f'{"warm merge, ms":>15}')
+        for count in options['authors']:
+            with transaction.atomic():
+                reader, author_ids = self._populate(
+                    count, options['posts_per_author'])
+                orm, cold, warm = self._measure(
+                    reader, author_ids, options['repeat'])
+                cache.delete_many(
+                    [feeds._timeline_key(pk) for pk in author_ids])
+                transaction.set_rollback(True)
+            self.stdout.write(
+                f'{count:>8} {orm:>9.2f} {cold:>15.2f} {warm:>15.2f}')
+
+    def _populate(self, count, posts_per_author):
+        reader = User.objects.create(username='benchmark_reader')
+        User.objects.bulk_create(
+            User(username=f'benchmark_author_{number}')
+            for number in range(count))
+        author_ids = list(User.objects.filter(
+            username__startswith='benchmark_author_').values_list(
+                'id', flat=True))
+        Post.objects.bulk_create(
+            (Post(text='Benchmark', author_id=author_id)
+             for _ in range(posts_per_author)
+             for author_id in author_ids),
+            batch_size=settings.FEED_BATCH_SIZE)
+        now = timezone.now()
+        post_ids = Post.objects.filter(
+            author_id__in=author_ids).order_by('-id').values_list(
+                'id', flat=True)
+        for number, post_id in enumerate(post_ids):
+            Post.objects.filter(id=post_id).update(
+                pub_date=now - timedelta(seconds=number))
+        Follow.objects.bulk_create(
+            Follow(user=reader, author_id=author_id)
+            for author_id in author_ids)
+        return reader, author_ids
+
+    def _measure(self, reader, author_ids, repeat):
+        post_list = Post.objects.filter(
+            author__following__user=reader).select_related(
+                'group', 'author')
+
+        def orm():
+            list(post_list.order_by('-pub_date', '-id')[
+                :settings.MAX_PAGE_AMOUNT])
+
+        def merge():
+            ids = Follow.objects.filter(
+                user=reader).values_list('author_id', flat=True)
+            list(feeds.timeline_page(ids, 1, post_list))
+
+        orm_ms = timeit(orm, number=repeat) / repeat * 1000
+        cache.delete_many([feeds._timeline_key(pk) for pk in author_ids])
+        cold_ms = timeit(merge, number=1) * 1000
+        warm_ms = timeit(merge, number=repeat) / repeat * 1000
+        return orm_ms, cold_ms, warm_ms
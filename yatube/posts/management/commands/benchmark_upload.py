@@ -0,0 +1,71 @@
+import multiprocessing
+import os
+import resource
+import tempfile
+from io import BytesIO
+
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from core.uploads import reencode_image
+
+
+def _naive(path):
+    with Image.open(path) as image:
+        image.load()
+        output = BytesIO()
+        image.convert('RGB').save(output, 'JPEG')
+
+
+def _reencode(path):
+    with open(path, 'rb') as upload:
+        reencode_image(upload)
+
+
+def _peak(func, path, queue):
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    func(path)
+    queue.put(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before)
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает прирост пикового RSS при полном декодировании '
+            'картинки и при обработке загрузки через reencode_image. '
+            'Каждый замер выполняется в отдельном процессе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', nargs='+', type=int, default=[2000, 4000, 6000])
+
+    def handle(self, *args, **options):
+        context = multiprocessing.get_context('fork')
+        self.stdout.write(
+            f'{"image":>14} {"file, KB":>9} {"full decode, MB":>16} '
+            f'{"reencode, MB":>13}')
+        with tempfile.TemporaryDirectory() as directory:
+            # Плагины Pillow загружаются до fork, чтобы не попасть в замер.
+            _reencode(self._make_image(directory, 16, 'JPEG'))
+            for side in options['sizes']:
+                for image_format in ('JPEG', 'PNG'):
+                    path = self._make_image(directory, side, image_format)
+                    naive, reencode = (
+                        self._measure(context, func, path)
+                        for func in (_naive, _reencode))
+                    self.stdout.write(
+                        f'{f"{image_format} {side}px":>14} '
+                        f'{os.path.getsize(path) // 1024:>9} '
+                        f'{naive / 1024:>16.1f} {reencode / 1024:>13.1f}')
+
+    def _make_image(self, directory, side, image_format):
+        path = os.path.join(directory, f'{side}.{image_format.lower()}')
+        image = Image.linear_gradient('L').resize((side, side * 3 // 4))
+        image.convert('RGB').save(path, image_format)
+        return path
+
+    def _measure(self, context, func, path):
+        queue = context.Queue()
+        process = context.Process(target=_peak, args=(func, path, queue))
+        process.start()
+        peak = queue.get()
+        process.join()
+        return peak
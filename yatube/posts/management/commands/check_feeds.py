@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import feeds
+from posts.models import FeedItem, Follow
+
+
+class Command(BaseCommand):
+    help = ('Проверяет, что ленты подписок совпадают с подписками, '
+            'и при --fix пересобирает расходящиеся ленты.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true')
+
+    def handle(self, *args, **options):
+        user_ids = Follow.objects.values_list('user_id', flat=True).union(
+            FeedItem.objects.values_list('user_id', flat=True))
+        broken = []
+        for user_id in user_ids:
+            missing, extra = feeds.check(user_id)
+            if missing or extra:
+                broken.append(user_id)
+                self.stdout.write(
+                    f'Пользователь {user_id}: не хватает {len(missing)}, '
+                    f'лишних {len(extra)}')
+        if broken and options['fix']:
+            feeds.rebuild(broken)
+            self.stdout.write(self.style.SUCCESS(
+                f'Пересобрано лент: {len(broken)}'))
+        elif broken:
+            raise CommandError(f'Расходящихся лент: {len(broken)}')
+        else:
+            self.stdout.write(self.style.SUCCESS('Ленты подписок в порядке'))
@@ -0,0 +1,99 @@
+import hashlib
+import os
+import posixpath
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from sorl import thumbnail
+
+from core.models import StoredFile
+from core.storage import hashed_name, is_content_addressed
+from core.thumbnails import source_file
+from posts.models import Post
+from posts.signals import invalidate_followers, invalidate_post_tags
+
+CHUNK_SIZE = 64 * 1024
+
+
+class Command(BaseCommand):
+    help = ('Переносит картинки записей в хранилище по хешу содержимого: '
+            'одинаковые файлы сливаются в один, записи переключаются '
+            'на новые имена, счётчики ссылок пересчитываются. Файлы '
+            'читаются потоково, по одному.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--directory', default='posts')
+        parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        storage = Post._meta.get_field('image').storage
+        moved = merged = freed = 0
+        for name in self._legacy_names(storage, options['directory']):
+            path = storage.path(name)
+            digest = self._digest(path)
+            new_name = hashed_name(
+                posixpath.dirname(name), digest, posixpath.splitext(name)[1])
+            new_path = storage.path(new_name)
+            exists = os.path.exists(new_path)
+            if exists:
+                merged += 1
+                freed += os.path.getsize(path)
+            else:
+                moved += 1
+            if options['dry_run']:
+                continue
+            if not exists:
+                os.makedirs(os.path.dirname(new_path), exist_ok=True)
+                # Ссылка, а не перенос: до обновления записей старое
+                # имя должно оставаться доступным.
+                os.link(path, new_path)
+            self._rename(name, new_name)
+            thumbnail.delete(source_file(name))
+        if not options['dry_run']:
+            self._rebuild_references(options['batch_size'])
+        self.stdout.write(
+            f'Перенесено {moved}, объединено {merged}, '
+            f'освобождено {freed // 1024} КБ')
+
+    @staticmethod
+    def _legacy_names(storage, directory):
+        root = storage.path(directory)
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                name = posixpath.join(directory, os.path.relpath(
+                    os.path.join(dirpath, filename), root).replace(
+                        os.sep, '/'))
+                if not filename.startswith('.') and not is_content_addressed(
+                        name):
+                    yield name
+
+    @staticmethod
+    def _digest(path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as file_:
+            for chunk in iter(lambda: file_.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _rename(name, new_name):
+        posts = list(Post.objects.filter(image=name).only(
+            'author_id', 'group_id'))
+        Post.objects.filter(image=name).update(image=new_name)
+        for post in posts:
+            invalidate_post_tags(post, post.group_id)
+            invalidate_followers(post)
+
+    @staticmethod
+    def _rebuild_references(batch_size):
+        references = Post.objects.exclude(image='').order_by().values(
+            'image').annotate(count=Count('pk'))
+        with transaction.atomic():
+            StoredFile.objects.all().delete()
+            StoredFile.objects.bulk_create(
+                (StoredFile(name=row['image'], references=row['count'])
+                 for row in references.iterator()
+                 if is_content_addressed(row['image'])),
+                batch_size=batch_size)
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts import feeds
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает ленты подписок с нуля по таблице подписок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='user_ids',
+            help='id пользователя, можно указать несколько раз')
+
+    def handle(self, *args, **options):
+        feeds.rebuild(options['user_ids'])
+        self.stdout.write(self.style.SUCCESS('Ленты подписок пересобраны'))
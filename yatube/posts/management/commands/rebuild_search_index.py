@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from posts.search import TABLE
+
+INSERT = (
+    f'INSERT INTO {TABLE}(rowid, text, author, group_title) '
+    f"SELECT post.id, post.text, author.username || ' ' || "
+    f"author.first_name || ' ' || author.last_name, "
+    f"coalesce(grp.title, '') "
+    f'FROM posts_post post '
+    f'JOIN auth_user author ON author.id = post.author_id '
+    f'LEFT JOIN posts_group grp ON grp.id = post.group_id '
+    f'WHERE post.id > %s AND post.id <= %s')
+DELETE = f'DELETE FROM {TABLE} WHERE rowid > %s AND rowid <= %s'
+DELETE_AFTER = f'DELETE FROM {TABLE} WHERE rowid > %s'
+BATCH_END = ('SELECT max(id) FROM (SELECT id FROM posts_post WHERE id > %s '
+             'ORDER BY id LIMIT %s)')
+
+
+class Command(BaseCommand):
+    help = ('Заново строит полнотекстовый индекс записей: строки '
+            'заменяются пачками в отдельных транзакциях, поэтому поиск '
+            'работает всё время перестройки. Затем индекс оптимизируется.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        with connection.cursor() as cursor:
+            last_pk, indexed = 0, 0
+            while True:
+                with transaction.atomic():
+                    cursor.execute(
+                        BATCH_END, [last_pk, options['batch_size']])
+                    batch_end = cursor.fetchone()[0]
+                    if batch_end is None:
+                        # Строки удалённых записей после последней.
+                        cursor.execute(DELETE_AFTER, [last_pk])
+                        break
+                    cursor.execute(DELETE, [last_pk, batch_end])
+                    cursor.execute(INSERT, [last_pk, batch_end])
+                    indexed += cursor.rowcount
+                    last_pk = batch_end
+            cursor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES ('optimize')")
+        self.stdout.write(f'Проиндексировано записей: {indexed}')
@@ -0,0 +1,38 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import counters
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Сверяет счётчики записей, комментариев и подписок с базой '
+            'и исправляет расхождения пачками.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for model, reconcile in ((User, counters.reconcile_users),
+                                 (Group, counters.reconcile_groups),
+                                 (Post, counters.reconcile_posts)):
+            fixed = 0
+            for ids in self._batches(model, options['batch_size']):
+                with transaction.atomic():
+                    fixed += reconcile(ids)
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: исправлено {fixed}')
+
+    @staticmethod
+    def _batches(model, batch_size):
+        last_pk = 0
+        while True:
+            ids = list(model.objects.filter(pk__gt=last_pk).order_by(
+                'pk').values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                return
+            yield ids
+            last_pk = ids[-1]
@@ -0,0 +1,63 @@
+# Generated by Django 2.2.16 on 2026-10-18 10:22
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 500
+
+
+def fill_feed_items(apps, schema_editor):
+    """Раскладывает записи по лентам существующих подписчиков пачками
+    по BATCH_SIZE подписок, каждая пачка — один INSERT ... SELECT."""
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    FeedItem = apps.get_model('posts', 'FeedItem')
+    insert = (
+        f'INSERT INTO {FeedItem._meta.db_table} (user_id, post_id, pub_date) '
+        f'SELECT follow.user_id, post.id, post.pub_date '
+        f'FROM {Follow._meta.db_table} follow '
+        f'JOIN {Post._meta.db_table} post '
+        f'ON post.author_id = follow.author_id '
+        f'WHERE follow.id > %s AND follow.id <= %s')
+    follow_ids = Follow.objects.order_by('pk').values_list('pk', flat=True)
+    last_pk = 0
+    while True:
+        batch = list(follow_ids.filter(pk__gt=last_pk)[:BATCH_SIZE])
+        if not batch:
+            break
+        schema_editor.execute(insert, [last_pk, batch[-1]])
+        last_pk = batch[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0015_auto_20240424_0326'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedItem',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата публикации')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_items', to='posts.Post', verbose_name='Запись')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_items', to=settings.AUTH_USER_MODEL, verbose_name='Подписчик')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты подписок',
+                'verbose_name_plural': 'Записи ленты подписок',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='feeditem',
+            index=models.Index(fields=['user', 'pub_date', 'post'], name='feed_item_user_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='feeditem',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='unique_feed_item'),
+        ),
+        migrations.RunPython(fill_feed_items, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+from django.db import migrations
+
+AUTHOR = ("(SELECT username || ' ' || first_name || ' ' || last_name "
+          "FROM auth_user WHERE id = new.author_id)")
+GROUP = ("coalesce((SELECT title FROM posts_group "
+         "WHERE id = new.group_id), '')")
+INSERT = (f'INSERT INTO posts_post_search(rowid, text, author, group_title) '
+          f'VALUES (new.id, new.text, {AUTHOR}, {GROUP});')
+
+# Записи, созданные до миграции, индексируются сразу же.
+POPULATE = (
+    "INSERT INTO posts_post_search(rowid, text, author, group_title) "
+    "SELECT post.id, post.text, author.username || ' ' || "
+    "author.first_name || ' ' || author.last_name, coalesce(grp.title, '') "
+    "FROM posts_post post "
+    "JOIN auth_user author ON author.id = post.author_id "
+    "LEFT JOIN posts_group grp ON grp.id = post.group_id")
+
+FORWARD = [
+    "CREATE VIRTUAL TABLE posts_post_search USING fts5("
+    "text, author, group_title, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+    f'CREATE TRIGGER posts_post_search_insert AFTER INSERT ON posts_post '
+    f'BEGIN {INSERT} END',
+    f'CREATE TRIGGER posts_post_search_update '
+    f'AFTER UPDATE OF text, author_id, group_id ON posts_post BEGIN '
+    f'DELETE FROM posts_post_search WHERE rowid = old.id; {INSERT} END',
+    'CREATE TRIGGER posts_post_search_delete AFTER DELETE ON posts_post '
+    'BEGIN DELETE FROM posts_post_search WHERE rowid = old.id; END',
+    "CREATE TRIGGER posts_post_search_user "
+    "AFTER UPDATE OF username, first_name, last_name ON auth_user BEGIN "
+    "UPDATE posts_post_search "
+    "SET author = new.username || ' ' || new.first_name || ' ' "
+    "|| new.last_name "
+    "WHERE rowid IN (SELECT id FROM posts_post WHERE author_id = new.id); "
+    "END",
+    'CREATE TRIGGER posts_post_search_group '
+    'AFTER UPDATE OF title ON posts_group BEGIN '
+    'UPDATE posts_post_search SET group_title = new.title '
+    'WHERE rowid IN (SELECT id FROM posts_post WHERE group_id = new.id); '
+    'END',
+    POPULATE,
+]
+
+BACKWARD = [
+    'DROP TRIGGER posts_post_search_group',
+    'DROP TRIGGER posts_post_search_user',
+    'DROP TRIGGER posts_post_search_delete',
+    'DROP TRIGGER posts_post_search_update',
+    'DROP TRIGGER posts_post_search_insert',
+    'DROP TABLE posts_post_search',
+]
+
+
+class Migration(migrations.Migration):
+    """Полнотекстовый индекс FTS5 записей: текст, автор, группа.
+
+    Существующие записи индексируются в миграции, дальше индекс
+    обновляют триггеры, в том числе при update() и bulk_create.
+    """
+
+    dependencies = [
+        ('posts', '0019_image_size'),
+        ('auth', '0011_update_proxy_permissions'),
+    ]
+
+    operations = [
+        migrations.RunSQL(FORWARD, BACKWARD),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from core.fields import store_image_size
+
 
 User = get_user_model()
 
@@ -17,6 +19,8 @@ class Group(models.Model):
     description = models.TextField(
         verbose_name='Описание группы',
         help_text='Укажите описание группы')
+    posts_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Количество записей')
 
     class Meta:
         verbose_name = 'Группа'
@@ -48,17 +52,36 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
-        blank=True)
+        blank=True,
+        width_field='image_width',
+        height_field='image_height')
+    image_width = models.PositiveIntegerField(
+        null=True, editable=False, verbose_name='Ширина картинки')
+    image_height = models.PositiveIntegerField(
+        null=True, editable=False, verbose_name='Высота картинки')
+    comments_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Количество комментариев')
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Запись'
         verbose_name_plural = 'Записи'
+        indexes = [
+            models.Index(fields=['author', 'pub_date'],
+                         name='post_author_date_idx'),
+            models.Index(fields=['group', 'pub_date'],
+                         name='post_group_date_idx'),
+            models.Index(fields=['pub_date', 'id'],
+                         name='post_date_id_idx'),
+            models.Index(fields=['image'], name='post_image_idx')]
 
     def __str__(self) -> str:
         return self.text[:15]
 
 
+store_image_size(Post, 'image')
+
+
 class Comment(models.Model):
     post = models.ForeignKey(
         Post,
@@ -81,8 +104,12 @@ class Comment(models.Model):
         return self.text
 
     class Meta:
+        ordering = ('created',)
         verbose_name = 'Коментарий'
         verbose_name_plural = 'Коментарии'
+        indexes = [
+            models.Index(fields=['post', 'created'],
+                         name='comment_post_created_idx')]
 
 
 class Follow(models.Model):
@@ -108,3 +135,55 @@ class Follow(models.Model):
                                     name='unique_follow'),
             models.CheckConstraint(check=~models.Q(user=models.F('author')),
                                    name='dont_follow_self')]
+        indexes = [
+            models.Index(fields=['author', 'user'],
+                         name='follow_author_user_idx')]
+
+
+class UserCounter(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters',
+        verbose_name='Пользователь')
+    posts_count = models.PositiveIntegerField(
+        default=0, verbose_name='Количество записей')
+    followers_count = models.PositiveIntegerField(
+        default=0, verbose_name='Количество подписчиков')
+    following_count = models.PositiveIntegerField(
+        default=0, verbose_name='Количество подписок')
+
+    def __str__(self) -> str:
+        return f'Счётчики пользователя {self.user_id}'
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+
+class FeedItem(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Подписчик')
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Запись')
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    def __str__(self) -> str:
+        return f'Запись {self.post_id} в ленте {self.user_id}'
+
+    class Meta:
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Записи ленты подписок'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='unique_feed_item')]
+        indexes = [
+            models.Index(fields=['user', 'pub_date', 'post'],
+                         name='feed_item_user_date_idx')]
@@ -0,0 +1,87 @@
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post
+
+TABLE = 'posts_post_search'
+# Маркеры выделения в snippet(): в тексте записей их не бывает,
+# поэтому текст можно экранировать, а потом заменить их на <mark>.
+MARK_START, MARK_END = '\x02', '\x03'
+WORD = re.compile(r'\w+')
+
+
+def match_expression(query):
+    """Запрос пользователя в синтаксисе FTS5: слова как префиксы,
+    все обязательны. Операторы и кавычки FTS5 не пропускаются.
+    None, если слов в запросе нет.
+    """
+    words = WORD.findall(query)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def highlight(snippet):
+    return mark_safe(escape(snippet).replace(
+        MARK_START, '<mark>').replace(MARK_END, '</mark>'))
+
+
+def matching_ids(query):
+    """Подзапрос id записей, подходящих под запрос, для filter(pk__in=)."""
+    return RawSQL(
+        f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s',
+        [match_expression(query) or '""'])
+
+
+class SearchResults:
+    """Записи по запросу из FTS5-индекса по убыванию релевантности
+    (bm25) для Paginator.
+
+    Срез читает из индекса только id и фрагменты страницы, записи
+    подгружаются одним запросом по первичному ключу. У записей
+    появляется snippet — фрагмент текста с <mark> на найденных словах.
+    """
+
+    def __init__(self, query, queryset=None, snippet_words=24):
+        self.match = match_expression(query)
+        self.queryset = queryset if queryset is not None else Post.objects
+        self.snippet_words = snippet_words
+
+    def count(self):
+        if self.match is None:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT count(*) FROM {TABLE} WHERE {TABLE} MATCH %s',
+                [self.match])
+            return cursor.fetchone()[0]
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            raise TypeError('SearchResults поддерживает только срезы')
+        if self.match is None:
+            return []
+        start = index.start or 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid, snippet({TABLE}, 0, %s, %s, '…', %s) "
+                f'FROM {TABLE} WHERE {TABLE} MATCH %s ORDER BY rank '
+                f'LIMIT %s OFFSET %s',
+                [MARK_START, MARK_END, self.snippet_words, self.match,
+                 index.stop - start, start])
+            rows = cursor.fetchall()
+        posts = self.queryset.in_bulk([pk for pk, _ in rows])
+        results = []
+        for pk, snippet in rows:
+            # Запись могла быть удалена между запросами.
+            if pk in posts:
+                posts[pk].snippet = highlight(snippet)
+                results.append(posts[pk])
+        return results
@@ -0,0 +1,192 @@
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save)
+from django.dispatch import receiver
+
+from core import storage
+from core.cache import ObjectCache, UserLRUCache, invalidate_tags
+from core.thumbnails import thumbnail_ready
+from core.utils import FeedCounter
+from . import counters, feeds, lookups
+from .models import Comment, Follow, Group, Post, User, UserCounter
+
+NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+def invalidate_post_counts(post, *group_ids):
+    """Сбрасывает счётчики лент, в которые попадает запись, после
+    фиксации транзакции."""
+    keys = ['index', f'profile:{post.author_id}']
+    keys += [f'group_list:{pk}' for pk in set(group_ids) if pk]
+    transaction.on_commit(partial(FeedCounter.invalidate, *keys))
+
+
+def _invalidate_follow_feeds(user_ids):
+    FeedCounter.invalidate(*(f'follow_index:{pk}' for pk in user_ids))
+    UserLRUCache('follow_feed').invalidate(*user_ids)
+
+
+def invalidate_follow_feeds(*user_ids):
+    """Сбрасывает счётчики и кэш лент подписок пользователей после
+    фиксации транзакции."""
+    transaction.on_commit(partial(_invalidate_follow_feeds, user_ids))
+    invalidate_tags(*(f'follow:{pk}' for pk in user_ids))
+
+
+def invalidate_followers(post):
+    """Сбрасывает ленты подписчиков автора: только для новой или
+    удалённой записи, правки обновляют блоки записей по post:<id>."""
+    invalidate_follow_feeds(*Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True))
+
+
+def invalidate_post_tags(post, *group_ids):
+    """Сбрасывает кэш страниц, на которых видна запись."""
+    invalidate_tags(
+        'feed:all', f'author:{post.author_id}', f'post:{post.pk}',
+        *(f'group:{pk}' for pk in set(group_ids) if pk))
+
+
+@receiver(thumbnail_ready)
+def post_thumbnail_ready(sender, name, **kwargs):
+    """Сбрасывает кэш страниц, где вместо картинки была заглушка."""
+    for post in Post.objects.filter(image=name).only(
+            'author_id', 'group_id'):
+        invalidate_post_tags(post, post.group_id)
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous_post(sender, instance, **kwargs):
+    instance._previous_group_id, instance._previous_image = None, ''
+    if instance.pk:
+        previous = sender.objects.filter(pk=instance.pk).values_list(
+            'group_id', 'image').first()
+        if previous is not None:
+            instance._previous_group_id, instance._previous_image = previous
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        transaction.on_commit(
+            partial(lookups.missing_posts.discard, instance.pk))
+        transaction.on_commit(partial(feeds.push_timeline, instance))
+        if settings.FOLLOW_FEED_ENGINE == 'inbox':
+            feeds.fan_out(instance)
+        counters.on_post_created(instance)
+        invalidate_followers(instance)
+    previous_image = getattr(instance, '_previous_image', '')
+    if not raw and instance.image.name != previous_image:
+        storage.retain(instance.image.name)
+        storage.release(previous_image)
+    previous_group_id = getattr(instance, '_previous_group_id', None)
+    if not created and previous_group_id != instance.group_id:
+        counters.on_post_moved(instance, previous_group_id)
+    if created or previous_group_id != instance.group_id:
+        invalidate_post_counts(instance, instance.group_id, previous_group_id)
+    invalidate_post_tags(instance, instance.group_id, previous_group_id)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    storage.release(instance.image.name)
+    transaction.on_commit(partial(feeds.drop_timeline, instance))
+    counters.on_post_deleted(instance)
+    invalidate_post_counts(instance, instance.group_id)
+    invalidate_post_tags(instance, instance.group_id)
+    invalidate_followers(instance)
+
+
+def invalidate_profiles(follow):
+    """Сбрасывает страницы профилей со счётчиками и кнопкой подписки."""
+    invalidate_tags(f'profile:{follow.author_id}', f'profile:{follow.user_id}')
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.on_follow(instance, 1)
+        if settings.FOLLOW_FEED_ENGINE == 'inbox':
+            feeds.backfill(instance.user_id, instance.author_id)
+    invalidate_follow_feeds(instance.user_id)
+    invalidate_profiles(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.on_follow(instance, -1)
+    if settings.FOLLOW_FEED_ENGINE == 'inbox':
+        feeds.remove(instance.user_id, instance.author_id)
+    invalidate_follow_feeds(instance.user_id)
+    invalidate_profiles(instance)
+
+
+def invalidate_comment_tags(comment):
+    if Comment.post.is_cached(comment):
+        post = comment.post
+    else:
+        post = Post.objects.filter(pk=comment.post_id).only(
+            'author_id', 'group_id').first()
+    if post is not None:
+        invalidate_post_tags(post, post.group_id)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.on_comment(instance, 1)
+    invalidate_comment_tags(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.on_comment(instance, -1)
+    invalidate_comment_tags(instance)
+
+
+def invalidate_objects(model):
+    """Сбрасывает кэш объектов модели после фиксации транзакции, чтобы
+    параллельный запрос не положил старую строку под новой версией."""
+    transaction.on_commit(partial(ObjectCache.invalidate_model, model))
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    invalidate_objects(Group)
+    invalidate_tags('feed:all', f'group:{instance.pk}')
+
+
+def _only_last_login(update_fields):
+    return update_fields is not None and set(update_fields) == {'last_login'}
+
+
+@receiver(pre_save, sender=User)
+def remember_previous_name(sender, instance, raw=False, update_fields=None,
+                           **kwargs):
+    instance._previous_name = None
+    if instance.pk and not raw and not _only_last_login(update_fields):
+        instance._previous_name = sender.objects.filter(
+            pk=instance.pk).values_list(*NAME_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, update_fields=None,
+               **kwargs):
+    if created and not raw:
+        UserCounter.objects.get_or_create(user=instance)
+    if not _only_last_login(update_fields):
+        invalidate_objects(User)
+    previous_name = getattr(instance, '_previous_name', None)
+    if previous_name is not None and previous_name != tuple(
+            getattr(instance, field) for field in NAME_FIELDS):
+        # Имя и ссылка на профиль есть в блоках записей на всех лентах.
+        invalidate_tags('feed:all', f'author:{instance.pk}')
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    invalidate_objects(User)
@@ -0,0 +1,215 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.admin import ACTION_CHECKBOX_NAME
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from ..admin import PostAdmin
+from ..models import Comment, FeedItem, Follow, Group, Post, UserCounter
+from ..search import SearchResults
+
+User = get_user_model()
+
+
+class AdminChangelistTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug',
+            description='Тестовое описание')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def add_rows(self, count):
+        start = User.objects.count()
+        for number in range(start, start + count):
+            author = User.objects.create_user(username=f'user{number}')
+            post = Post.objects.create(
+                author=author, group=self.group, text='Текст ' * 100)
+            Comment.objects.create(
+                post=post, author=author, text='Комментарий ' * 100)
+            Follow.objects.create(user=author, author=self.admin)
+
+    def queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context), response
+
+    def test_query_count_does_not_depend_on_rows(self):
+        """Количество запросов списков не растёт с числом строк."""
+        for model in ('post', 'comment', 'follow'):
+            with self.subTest(model=model):
+                url = reverse(f'admin:posts_{model}_changelist')
+                self.add_rows(2)
+                few, _ = self.queries(url)
+                self.add_rows(5)
+                many, response = self.queries(url)
+                self.assertEqual(few, many)
+                self.assertLessEqual(many, 8)
+                self.assertGreaterEqual(
+                    len(response.context['cl'].result_list), 7)
+
+    def test_post_changelist(self):
+        """Список записей: обрезанный текст, без выбора группы в строках."""
+        self.add_rows(1)
+        response = self.client.get(reverse('admin:posts_post_changelist'))
+        self.assertNotContains(response, '<select name="form-0-group"')
+        self.assertNotContains(response, 'Текст ' * 20)
+        self.assertContains(response, '…')
+        self.assertContains(response, '1 Запись')
+
+    @override_settings(ADMIN_COUNT_LIMIT=3)
+    @mock.patch.object(PostAdmin, 'list_per_page', 1)
+    def test_count_limited(self):
+        """Строки считаются не дальше ADMIN_COUNT_LIMIT и нескольких
+        страниц после текущей, неточное количество помечено «+»."""
+        self.add_rows(8)
+        url = reverse('admin:posts_post_changelist')
+        response = self.client.get(url)
+        self.assertEqual(response.context['cl'].result_count, 4)
+        self.assertContains(response, '4+ Записи')
+        self.assertContains(response, '?p=3')
+        response = self.client.get(url, {'p': 3})
+        self.assertContains(response, '7+ Записи')
+        self.assertContains(response, '?p=6')
+        response = self.client.get(url, {'p': 6})
+        self.assertEqual(len(response.context['cl'].result_list), 1)
+        self.assertContains(response, '8 Записи')
+        self.assertNotContains(response, '8+ Записи')
+
+    def test_change_form_uses_autocomplete(self):
+        """Форма записи не выводит всех пользователей и группы."""
+        self.add_rows(3)
+        post = Post.objects.first()
+        response = self.client.get(
+            reverse('admin:posts_post_change', args=(post.pk,)))
+        self.assertContains(response, 'admin-autocomplete')
+        self.assertNotContains(response, 'user1<')
+
+
+@override_settings(BULK_BATCH_SIZE=2)
+class AdminBulkActionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        cls.author = User.objects.create_user(username='author')
+        cls.spammer = User.objects.create_user(username='spammer')
+        cls.group = Group.objects.create(
+            title='Старая группа', slug='old', description='Описание')
+        cls.target = Group.objects.create(
+            title='Новая группа', slug='new', description='Описание')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def act(self, model, action, objects, **data):
+        return self.client.post(
+            reverse(f'admin:posts_{model}_changelist'),
+            {'action': action, 'index': 0,
+             ACTION_CHECKBOX_NAME: [obj.pk for obj in objects], **data},
+            follow=True)
+
+    def test_move_to_group(self):
+        """Записи переносятся в группу пачками, счётчики групп
+        и поисковый индекс обновляются."""
+        posts = [Post.objects.create(
+            author=self.author, group=self.group, text=f'Запись {number}')
+            for number in range(5)]
+        response = self.act(
+            'post', 'move_to_group', posts[:4], group=self.target.pk)
+        self.assertContains(response, 'Обработано строк: 4.')
+        self.assertEqual(
+            Post.objects.filter(group=self.target).count(), 4)
+        self.group.refresh_from_db()
+        self.target.refresh_from_db()
+        self.assertEqual(
+            (self.group.posts_count, self.target.posts_count), (1, 4))
+        self.assertEqual(len(SearchResults('новая')[:10]), 4)
+
+    def test_move_requires_group(self):
+        """Без выбранной группы записи не переносятся."""
+        post = Post.objects.create(
+            author=self.author, group=self.group, text='Запись')
+        response = self.act('post', 'move_to_group', [post])
+        self.assertContains(response, 'Выберите группу')
+        self.assertEqual(Post.objects.get().group, self.group)
+
+    def test_purge_comment_authors(self):
+        """Удаляются все комментарии авторов выбранных комментариев,
+        счётчики комментариев пересчитываются."""
+        post = Post.objects.create(author=self.author, text='Запись')
+        spam = [Comment.objects.create(
+            post=post, author=self.spammer, text='Спам')
+            for _ in range(5)]
+        Comment.objects.create(post=post, author=self.author, text='Ответ')
+        self.act('comment', 'purge_authors', spam[:1], post='yes')
+        self.assertEqual(
+            list(Comment.objects.values_list('author', flat=True)),
+            [self.author.pk])
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+    def test_purge_asks_confirmation(self):
+        """Удаление всех строк авторов и пользователей сначала
+        показывает, сколько строк будет удалено."""
+        post = Post.objects.create(author=self.author, text='Запись')
+        spam = [Comment.objects.create(
+            post=post, author=self.spammer, text='Спам')
+            for _ in range(3)]
+        follows = [Follow.objects.create(
+            user=self.spammer,
+            author=User.objects.create_user(username=f'writer{number}'))
+            for number in range(3)]
+        for model, action, objects in (
+                ('comment', 'purge_authors', spam[:1]),
+                ('follow', 'purge_users', follows[:1])):
+            with self.subTest(action=action):
+                response = self.act(model, action, objects)
+                self.assertTemplateUsed(
+                    response, 'admin/posts/confirm_bulk_action.html')
+                self.assertContains(response, 'Будет удалено строк: 3.')
+                self.assertContains(
+                    response, '<input type="hidden" name="post" value="yes">')
+        self.assertEqual(Comment.objects.count(), 3)
+        self.assertEqual(Follow.objects.count(), 3)
+
+    def test_purge_older_comments(self):
+        """Удаляются выбранные комментарии старше даты."""
+        post = Post.objects.create(author=self.author, text='Запись')
+        comments = [Comment.objects.create(
+            post=post, author=self.author, text='Комментарий')
+            for _ in range(3)]
+        Comment.objects.filter(pk__in=[c.pk for c in comments[:2]]).update(
+            created=timezone.now() - timedelta(days=30))
+        self.act('comment', 'purge_older', comments,
+                 before=timezone.localdate().isoformat())
+        self.assertEqual(list(Comment.objects.all()), comments[2:])
+
+    def test_purge_follows(self):
+        """Удаляются все подписки пользователя вместе с лентой,
+        счётчики подписок пересчитываются."""
+        authors = [User.objects.create_user(username=f'writer{number}')
+                   for number in range(3)]
+        for author in authors:
+            Post.objects.create(author=author, text='Запись')
+            Follow.objects.create(user=self.spammer, author=author)
+        Follow.objects.create(user=self.author, author=authors[0])
+        self.act('follow', 'purge_users',
+                 Follow.objects.filter(user=self.spammer)[:1], post='yes')
+        self.assertFalse(Follow.objects.filter(user=self.spammer).exists())
+        self.assertFalse(FeedItem.objects.filter(user=self.spammer).exists())
+        self.assertEqual(FeedItem.objects.filter(user=self.author).count(), 1)
+        self.assertEqual(UserCounter.objects.get(
+            user=self.spammer).following_count, 0)
+        self.assertEqual(UserCounter.objects.get(
+            user=authors[0]).followers_count, 1)
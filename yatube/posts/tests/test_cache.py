@@ -1,13 +1,20 @@
+from unittest import mock
+
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
-from django.core.cache import cache
+from django.core.cache import cache, caches
+from django.db import transaction
 
-from ..models import Post
+from core.cache import (
+    ObjectCache, UserLRUCache, invalidate_tags, tag_versions)
+from .. import lookups
+from ..models import Comment, Follow, Group, Post
 
 User = get_user_model()
 
 
+@mock.patch('django.db.transaction.on_commit', lambda func: func())
 class PostPagesTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -25,7 +32,7 @@ class PostPagesTests(TestCase):
         """Проверка кэша страницы индекс."""
         response_first = self.authorized_client.get(
             reverse('posts:index')).content
-        self.post.delete()
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигналов')
         response_second = self.authorized_client.get(
             reverse('posts:index')).content
         self.assertEqual(response_first, response_second)
@@ -33,3 +40,343 @@ class PostPagesTests(TestCase):
         response_third = self.authorized_client.get(
             reverse('posts:index')).content
         self.assertNotEqual(response_third, response_second)
+
+    def test_cache_invalidated_by_content_events(self):
+        """Новая, изменённая и удалённая запись сразу видны на страницах."""
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': self.user}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+        for page in pages:
+            self.authorized_client.get(page)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Изменённый пост'
+        post.save()
+        for page in pages:
+            with self.subTest(page=page):
+                self.assertContains(
+                    self.authorized_client.get(page), 'Изменённый пост')
+        Comment.objects.create(
+            post=post, author=self.user, text='Новый комментарий')
+        self.assertContains(
+            self.authorized_client.get(pages[2]), 'Новый комментарий')
+        post.delete()
+        self.assertNotContains(
+            self.authorized_client.get(pages[0]), 'Изменённый пост')
+
+
+@mock.patch('django.db.transaction.on_commit', lambda func: func())
+class FollowFeedCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.other = User.objects.create_user(username='other')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Post.objects.create(text='Первая запись', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        caches['follow_feed'].clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.other_client = Client()
+        self.other_client.force_login(self.other)
+
+    def test_feed_cached_per_user(self):
+        """Кэш ленты подписок у каждого пользователя свой."""
+        url = reverse('posts:follow_index')
+        self.assertContains(self.reader_client.get(url), 'Первая запись')
+        self.assertNotContains(self.other_client.get(url), 'Первая запись')
+        Post.objects.filter(author=self.author).update(text='Без сигналов')
+        self.assertContains(self.reader_client.get(url), 'Первая запись')
+
+    def test_feed_invalidated_by_post_and_follow(self):
+        """Новая запись и подписка сбрасывают кэш ленты подписчика."""
+        url = reverse('posts:follow_index')
+        self.reader_client.get(url)
+        self.other_client.get(url)
+        Post.objects.create(text='Вторая запись', author=self.author)
+        self.assertContains(self.reader_client.get(url), 'Вторая запись')
+        Follow.objects.create(user=self.other, author=self.author)
+        self.assertContains(self.other_client.get(url), 'Вторая запись')
+        Follow.objects.filter(user=self.other).delete()
+        self.assertNotContains(self.other_client.get(url), 'Вторая запись')
+
+    def test_edits_do_not_touch_followers(self):
+        """Правка записи и комментарий не сбрасывают ленты подписчиков,
+        но блок записи в ленте обновляется."""
+        url = reverse('posts:follow_index')
+        self.reader_client.get(url)
+        version = tag_versions([f'follow:{self.reader.pk}'])
+        post = Post.objects.get(author=self.author)
+        post.text = 'Изменённая запись'
+        post.save()
+        Comment.objects.create(post=post, author=self.other, text='Ответ')
+        self.assertEqual(
+            tag_versions([f'follow:{self.reader.pk}']), version)
+        self.assertContains(self.reader_client.get(url), 'Изменённая запись')
+
+    @override_settings(USER_CACHE_MAX_ENTRIES=2)
+    def test_lru_eviction(self):
+        """Сверх лимита вытесняется давно не читавшаяся запись."""
+        user_cache = UserLRUCache('follow_feed')
+        for key in ('first', 'second'):
+            user_cache.set(self.reader.pk, key, key)
+        user_cache.get(self.reader.pk, 'first')
+        user_cache.set(self.reader.pk, 'third', 'third')
+        self.assertIsNone(user_cache.get(self.reader.pk, 'second'))
+        self.assertEqual(user_cache.get(self.reader.pk, 'first'), 'first')
+        self.assertEqual(user_cache.get(self.reader.pk, 'third'), 'third')
+        self.assertIsNone(user_cache.get(self.other.pk, 'first'))
+
+
+@mock.patch('django.db.transaction.on_commit', lambda func: func())
+class AnonymousPageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='NoName')
+        cls.post = Post.objects.create(text='Тестовый пост', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    @override_settings(POST_FRAGMENT_TIMEOUT=0)
+    def test_page_cached_for_guest(self):
+        """Гость получает страницу из кэша, не запуская view."""
+        url = reverse('posts:profile', kwargs={'username': self.user})
+        self.assertIsNotNone(self.guest_client.get(url).context)
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигналов')
+        response = self.guest_client.get(url)
+        self.assertIsNone(response.context)
+        self.assertContains(response, 'Тестовый пост')
+        self.assertContains(
+            self.guest_client.get(url + '?page=1'), 'Без сигналов')
+
+    def test_page_invalidated_by_content_events(self):
+        """Новая запись сбрасывает закэшированные страницы гостя."""
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        Post.objects.create(text='Новая запись', author=self.user)
+        self.assertContains(self.guest_client.get(url), 'Новая запись')
+
+    def test_authorized_user_not_cached(self):
+        """Страницы с cookie сессии не берутся из кэша целиком."""
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        response = self.authorized_client.get(url)
+        self.assertIsNotNone(response.context)
+        self.assertContains(response, 'NoName')
+
+
+@mock.patch('django.db.transaction.on_commit', lambda func: func())
+class PostFragmentCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='NoName')
+        for number in range(3):
+            Post.objects.create(text=f'Запись {number}', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_fragments_read_in_one_round_trip(self):
+        """Блоки записей страницы читаются одним get_many."""
+        url = reverse('posts:profile', kwargs={'username': self.user})
+        calls = []
+        get_many = cache.get_many
+
+        def counting_get_many(keys, *args, **kwargs):
+            keys = list(keys)
+            calls.append(keys)
+            return get_many(keys, *args, **kwargs)
+
+        self.authorized_client.get(url)
+        with mock.patch.object(cache, 'get_many', counting_get_many):
+            self.authorized_client.get(url + '?page=1')
+        fragment_calls = [
+            keys for keys in calls
+            if any(key.startswith('fragment:') for key in keys)]
+        self.assertEqual(len(fragment_calls), 1)
+        self.assertEqual(len([
+            key for key in fragment_calls[0]
+            if key.startswith('fragment:')]), 3)
+
+    def test_fragment_version_bumped_by_edit(self):
+        """Правка записи и смена группы обновляют её блок."""
+        url = reverse('posts:index')
+        post = Post.objects.filter(author=self.user).first()
+        self.authorized_client.get(url)
+        Post.objects.filter(pk=post.pk).update(text='Без сигналов')
+        self.assertNotContains(
+            self.authorized_client.get(url + '?page=1'), 'Без сигналов')
+        group = Group.objects.create(title='Группа', slug='group')
+        post.refresh_from_db()
+        post.group = group
+        post.save()
+        self.assertContains(
+            self.authorized_client.get(url + '?page=1'), 'Без сигналов')
+
+    def test_fragment_follows_group_and_author(self):
+        """Смена slug группы и имени автора обновляет блоки записей."""
+        url = reverse('posts:index')
+        group = Group.objects.create(title='Группа', slug='oldslug')
+        Post.objects.create(text='В группе', author=self.user, group=group)
+        self.authorized_client.get(url)
+        group.slug = 'newslug'
+        group.save()
+        author = User.objects.get(pk=self.user.pk)
+        author.first_name = 'Лев'
+        author.save()
+        response = self.authorized_client.get(url + '?page=1')
+        self.assertContains(response, '/group/newslug/')
+        self.assertNotContains(response, '/group/oldslug/')
+        self.assertContains(response, 'Лев')
+
+
+class TagInvalidationTests(TestCase):
+    def test_tags_bumped_after_commit(self):
+        """Версии тегов меняются только после фиксации транзакции."""
+        version = tag_versions(['feed:all'])
+        with transaction.atomic():
+            invalidate_tags('feed:all')
+            self.assertEqual(tag_versions(['feed:all']), version)
+        with mock.patch(
+                'django.db.transaction.on_commit', lambda func: func()):
+            invalidate_tags('feed:all')
+        self.assertNotEqual(tag_versions(['feed:all']), version)
+
+    def test_group_save_does_not_scan_posts(self):
+        """Сохранение группы не перебирает её записи."""
+        group = Group.objects.create(title='Группа', slug='group')
+        author = User.objects.create_user(username='author')
+        for number in range(3):
+            Post.objects.create(
+                text=f'Запись {number}', author=author, group=group)
+        with self.assertNumQueries(1):
+            group.save()
+
+
+class ObjectCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(title='Группа', slug='group')
+
+    def setUp(self):
+        cache.clear()
+        ObjectCache.invalidate_model(Group)
+        self.groups = ObjectCache(Group, 'slug')
+
+    def tearDown(self):
+        ObjectCache.instances.remove(self.groups)
+
+    def test_two_tiers(self):
+        """Повторный поиск идёт в память процесса, затем в общий кэш."""
+        with self.assertNumQueries(1):
+            self.assertEqual(self.groups.get('group'), self.group)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.groups.get('group'), self.group)
+        self.groups.local.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.groups.get('group').title, 'Группа')
+        stats = self.groups.stats()
+        self.assertEqual(
+            (stats['miss'], stats['local'], stats['shared']), (1, 1, 1))
+
+    def test_invalidated_by_row_change(self):
+        """Изменение группы после фиксации меняет версию и очищает
+        оба уровня."""
+        self.groups.get('group')
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Новое название'
+        with transaction.atomic():
+            group.save()
+            self.assertEqual(self.groups.get('group').title, 'Группа')
+        with mock.patch(
+                'django.db.transaction.on_commit', lambda func: func()):
+            group.save()
+        self.assertEqual(self.groups.get('group').title, 'Новое название')
+
+    def test_kept_by_post_writes(self):
+        """Записи группы не сбрасывают кэш групп."""
+        self.groups.get('group')
+        author = User.objects.create_user(username='author')
+        post = Post.objects.create(
+            text='Запись', author=author, group=self.group)
+        post.delete()
+        with self.assertNumQueries(0):
+            self.groups.get('group')
+
+    def test_only_public_user_fields(self):
+        """В общий кэш попадают только публичные поля пользователя."""
+        User.objects.create_user(username='author', password='secret')
+        lookups.users.get('author')
+        cached = cache.get(lookups.users._key('author'))[1]
+        self.assertEqual(cached.username, 'author')
+        self.assertIn('password', cached.get_deferred_fields())
+
+    @override_settings(OBJECT_CACHE_LOCAL_SIZE=1)
+    def test_local_lru(self):
+        """Локальный уровень не растёт больше OBJECT_CACHE_LOCAL_SIZE."""
+        Group.objects.create(title='Вторая', slug='second')
+        self.groups.get('group')
+        self.groups.get('second')
+        self.assertEqual(list(self.groups.local), ['second'])
+        with self.assertRaises(Group.DoesNotExist):
+            self.groups.get('missing')
+
+    def test_stats_view(self):
+        """Статистика кэшей объектов доступна только персоналу."""
+        url = reverse('object_cache_stats')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        self.assertIn('posts.group:slug', self.client.get(url).json())
+
+
+class NegativeCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        ObjectCache.invalidate_model(Group)
+        ObjectCache.invalidate_model(User)
+
+    def test_missing_objects_cached(self):
+        """Повторный запрос отсутствующего объекта не идёт в базу."""
+        urls = (
+            reverse('posts:profile', kwargs={'username': 'missing'}),
+            reverse('posts:group_list', kwargs={'slug': 'missing'}),
+            reverse('posts:post_detail', kwargs={'post_id': 10 ** 6}),
+            reverse('posts:post_detail', kwargs={'post_id': 10 ** 23}),
+        )
+        for url in urls:
+            self.assertEqual(self.client.get(url).status_code, 404)
+            with self.subTest(url=url), self.assertNumQueries(0):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_cleared_on_create(self):
+        """Созданный объект сразу виден несмотря на кэш отсутствия."""
+        urls = (
+            reverse('posts:profile', kwargs={'username': 'missing'}),
+            reverse('posts:group_list', kwargs={'slug': 'missing'}),
+            reverse('posts:post_detail', kwargs={'post_id': 10 ** 6}),
+        )
+        for url in urls:
+            self.client.get(url)
+        with mock.patch(
+                'django.db.transaction.on_commit', lambda func: func()):
+            user = User.objects.create_user(username='missing')
+            Group.objects.create(title='Группа', slug='missing')
+            Post.objects.create(pk=10 ** 6, text='Запись', author=user)
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
@@ -0,0 +1,82 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Post
+
+User = get_user_model()
+
+
+@mock.patch('django.db.transaction.on_commit', lambda func: func())
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(text='Тестовый пост', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_not_modified_by_etag(self):
+        """Страницы с тем же ETag отвечают 304, новая запись меняет ETag."""
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': self.author}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('posts:follow_index'),
+        )
+        etags = {}
+        for page in pages:
+            response = self.reader_client.get(page)
+            etags[page] = response['ETag']
+            with self.subTest(page=page):
+                self.assertEqual(self.reader_client.get(
+                    page, HTTP_IF_NONE_MATCH=etags[page]).status_code, 304)
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.create(text='Новая запись', author=self.author)
+        for page in pages:
+            with self.subTest(page=page):
+                self.assertEqual(self.reader_client.get(
+                    page, HTTP_IF_NONE_MATCH=etags[page]).status_code, 200)
+
+    def test_not_modified_since(self):
+        """If-Modified-Since отвечает 304 по дате последнего комментария."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        response = self.reader_client.get(url)
+        self.assertEqual(self.reader_client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        ).status_code, 304)
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий')
+        self.assertEqual(self.reader_client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_etag_depends_on_user(self):
+        """Гость и пользователь получают разные ETag одной страницы."""
+        url = reverse('posts:index')
+        self.assertNotEqual(
+            self.guest_client.get(url)['ETag'],
+            self.reader_client.get(url)['ETag'])
+
+    def test_cached_guest_page_not_modified(self):
+        """Страница гостя из кэша тоже отвечает 304."""
+        url = reverse('posts:index')
+        etag = self.guest_client.get(url)['ETag']
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertIsNone(response.context)
+
+    def test_missing_object(self):
+        """Для несуществующего объекта валидаторы не отдаются."""
+        response = self.reader_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': 10 ** 6}))
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.has_header('ETag'))
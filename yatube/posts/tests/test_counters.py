@@ -0,0 +1,90 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Group, Post, UserCounter
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='NoName')
+        cls.author = User.objects.create_user(username='Author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_group',
+            description='Тестовое описание группы')
+        cls.group_second = Group.objects.create(
+            title='Вторая группа',
+            slug='second_group',
+            description='Тестовое описание группы')
+        cls.post = Post.objects.create(
+            text='Тестовый пост', author=cls.author, group=cls.group)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def assertCounters(self, user, **expected):
+        counter = UserCounter.objects.get(user=user)
+        for field, value in expected.items():
+            self.assertEqual(getattr(counter, field), value, field)
+
+    def test_counters_follow_views(self):
+        """Счётчики меняются при записях, комментариях и подписках"""
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            {'text': 'Комментарий'})
+        self.authorized_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': self.author}))
+        self.post.refresh_from_db()
+        self.group.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertCounters(self.author, posts_count=1, followers_count=1)
+        self.assertCounters(self.user, following_count=1)
+        self.authorized_client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': self.author}))
+        self.assertCounters(self.author, followers_count=0)
+        self.assertCounters(self.user, following_count=0)
+
+    def test_counters_follow_group_change_and_delete(self):
+        """Смена группы и удаление записи меняют счётчики"""
+        self.authorized_client.force_login(self.author)
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.id}),
+            {'text': 'Новый текст', 'group': self.group_second.id})
+        self.group.refresh_from_db()
+        self.group_second.refresh_from_db()
+        self.assertEqual(
+            (self.group.posts_count, self.group_second.posts_count), (0, 1))
+        Post.objects.get(pk=self.post.pk).delete()
+        self.group_second.refresh_from_db()
+        self.assertEqual(self.group_second.posts_count, 0)
+        self.assertCounters(self.author, posts_count=0)
+
+    def test_post_detail_reads_counter(self):
+        """post_detail берёт количество записей автора из счётчика"""
+        UserCounter.objects.filter(user=self.author).update(posts_count=7)
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}))
+        self.assertEqual(response.context['count'], 7)
+
+    def test_reconcile_counters(self):
+        """reconcile_counters исправляет разошедшиеся счётчики"""
+        Comment.objects.bulk_create([Comment(
+            post=self.post, author=self.user, text='Комментарий')])
+        UserCounter.objects.filter(user=self.author).delete()
+        Group.objects.update(posts_count=5)
+        call_command('reconcile_counters', batch_size=1, stdout=StringIO())
+        self.post.refresh_from_db()
+        self.group.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertCounters(self.author, posts_count=1)
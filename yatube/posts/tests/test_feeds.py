@@ -0,0 +1,118 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DatabaseError, transaction
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import feeds
+from ..models import FeedItem, Follow, Post
+
+User = get_user_model()
+
+
+class FollowFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='NoName')
+        cls.author = User.objects.create_user(username='Author')
+        cls.post = Post.objects.create(
+            text='Тестовый пост', author=cls.author)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def feed(self):
+        return set(self.user.feed_items.values_list('post_id', flat=True))
+
+    def test_follow_backfills_and_unfollow_removes_feed(self):
+        """Подписка добавляет записи автора в ленту, отписка убирает"""
+        self.authorized_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': self.author}))
+        self.assertEqual(self.feed(), {self.post.id})
+        self.authorized_client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': self.author}))
+        self.assertEqual(self.feed(), set())
+
+    def test_new_post_fans_out_to_followers(self):
+        """Новая запись автора попадает в ленту подписчика"""
+        Follow.objects.create(user=self.user, author=self.author)
+        new_post = Post.objects.create(text='Ещё пост', author=self.author)
+        self.assertIn(new_post.id, self.feed())
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            response.context['page_obj'].object_list,
+            [new_post, self.post])
+
+    def test_check_and_rebuild_feeds(self):
+        """check_feeds находит расхождения, а --fix их исправляет"""
+        Follow.objects.create(user=self.user, author=self.author)
+        FeedItem.objects.all().delete()
+        with self.assertRaises(CommandError):
+            call_command('check_feeds', stdout=StringIO())
+        call_command('check_feeds', fix=True, stdout=StringIO())
+        self.assertEqual(self.feed(), {self.post.id})
+        call_command('rebuild_feeds', stdout=StringIO())
+        self.assertEqual(self.feed(), {self.post.id})
+
+
+@override_settings(FOLLOW_FEED_ENGINE='timeline', TIMELINE_LENGTH=20)
+class TimelineFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='NoName')
+        cls.authors = [
+            User.objects.create_user(username=f'Author{number}')
+            for number in range(3)]
+        for number in range(45):
+            Post.objects.create(
+                text=f'Тестовый пост №{number}',
+                author=cls.authors[number % 3])
+        for author in cls.authors[:2]:
+            Follow.objects.create(user=cls.user, author=author)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_timeline_pages_match_database_order(self):
+        """Слияние хронологий даёт тот же порядок, что и запрос к базе"""
+        expected = list(Post.objects.filter(
+            author__following__user=self.user).order_by('-pub_date', '-id'))
+        for number in (1, 2, 3):
+            with self.subTest(page=number):
+                response = self.authorized_client.get(
+                    reverse('posts:follow_index'), {'page': number})
+                self.assertEqual(
+                    list(response.context['page_obj']),
+                    expected[(number - 1) * 10:number * 10])
+
+    @mock.patch('django.db.transaction.on_commit', lambda func: func())
+    def test_timeline_follows_new_and_deleted_posts(self):
+        """Хронология обновляется при создании и удалении записи"""
+        self.authorized_client.get(reverse('posts:follow_index'))
+        new_post = Post.objects.create(text='Новый', author=self.authors[0])
+        with self.assertNumQueries(4):
+            response = self.authorized_client.get(
+                reverse('posts:follow_index'))
+        self.assertEqual(response.context['page_obj'][0], new_post)
+        new_post.delete()
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertNotIn(new_post, response.context['page_obj'])
+
+    def test_rolled_back_post_not_in_timeline(self):
+        """Запись из отменённой транзакции не попадает в хронологию"""
+        author_ids = [self.authors[0].pk]
+        timelines = feeds.get_timelines(author_ids)
+        with self.assertRaises(DatabaseError), transaction.atomic():
+            Post.objects.create(text='Отменённый', author=self.authors[0])
+            raise DatabaseError
+        self.assertEqual(feeds.get_timelines(author_ids), timelines)
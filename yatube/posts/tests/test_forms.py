@@ -1,12 +1,17 @@
 import shutil
 import tempfile
+from io import BytesIO
 
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase, override_settings
+from django.http.multipartparser import MultiPartParser
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
 from django.conf import settings
+from PIL import Image
 
+from core.uploads import LimitedTemporaryFileUploadHandler, truncated_uploads
 from ..models import Post, Group, Comment
 
 User = get_user_model()
@@ -70,7 +75,7 @@ class PostFormTests(TestCase):
             Post.objects.filter(
                 text=form_data['text'],
                 group=form_data['group'],
-                image='posts/small.gif'
+                image__regex=r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.webp$'
             ).exists())
 
     def test_edit_post(self):
@@ -178,3 +183,92 @@ class PostFormTests(TestCase):
                 post=self.post,
                 author=self.user
             ).exists())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageUploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='NoName')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    @staticmethod
+    def jpeg(size, **kwargs):
+        output = BytesIO()
+        Image.new('RGB', size, (200, 50, 50)).save(output, 'JPEG', **kwargs)
+        return SimpleUploadedFile(
+            'photo.jpg', output.getvalue(), content_type='image/jpeg')
+
+    def create_post(self, image):
+        return self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Запись с картинкой', 'image': image})
+
+    @override_settings(IMAGE_UPLOAD_MAX_SIDE=500)
+    def test_image_reencoded(self):
+        """Картинка уменьшается, теряет EXIF и сохраняется в WebP."""
+        exif = Image.Exif()
+        exif[0x010f] = 'Camera'
+        self.create_post(self.jpeg((3000, 2000), exif=exif.tobytes()))
+        post = Post.objects.get(text='Запись с картинкой')
+        self.assertRegex(
+            post.image.name, r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.webp$')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.format, 'WEBP')
+            self.assertEqual(image.size, (500, 333))
+            self.assertEqual(len(image.getexif()), 0)
+
+    def test_edit_updates_image_size(self):
+        """При замене картинки обновляются её ширина и высота."""
+        self.create_post(self.jpeg((40, 30)))
+        post = Post.objects.get(text='Запись с картинкой')
+        self.assertEqual((post.image_width, post.image_height), (40, 30))
+        self.authorized_client.post(
+            reverse('posts:post_edit', args=(post.pk,)),
+            data={'text': 'Новая картинка', 'image': self.jpeg((200, 100))})
+        post.refresh_from_db()
+        self.assertEqual(post.text, 'Новая картинка')
+        self.assertEqual((post.image_width, post.image_height), (200, 100))
+
+    @override_settings(IMAGE_UPLOAD_MAX_BYTES=1024)
+    def test_byte_limit(self):
+        """Файл больше IMAGE_UPLOAD_MAX_BYTES отклоняется."""
+        response = self.create_post(self.jpeg((1000, 1000), quality=100))
+        self.assertFormError(
+            response, 'form', 'image', 'Файл больше 1,0\xa0КБ.')
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(IMAGE_UPLOAD_MAX_BYTES=1024)
+    def test_upload_stops_at_limit(self):
+        """Тело запроса не дочитывается после превышения лимита."""
+        body = encode_multipart(BOUNDARY, {
+            'text': 'Большой файл',
+            'image': SimpleUploadedFile('big.jpg', b'0' * 10 ** 6)})
+        stream = BytesIO(body)
+        request = RequestFactory().post('/')
+        parser = MultiPartParser(
+            {'CONTENT_TYPE': MULTIPART_CONTENT,
+             'CONTENT_LENGTH': len(body)},
+            stream, [LimitedTemporaryFileUploadHandler(request)])
+        data, files = parser.parse()
+        self.assertEqual(data['text'], 'Большой файл')
+        self.assertNotIn('image', files)
+        self.assertEqual(truncated_uploads(request), {'image'})
+        self.assertLess(stream.tell(), len(body) // 2)
+
+    @override_settings(IMAGE_UPLOAD_MAX_PIXELS=10 ** 6)
+    def test_pixel_limit(self):
+        """Картинка больше IMAGE_UPLOAD_MAX_PIXELS отклоняется."""
+        response = self.create_post(self.jpeg((2000, 1000)))
+        self.assertFormError(
+            response, 'form', 'image', 'Картинка больше 1 мегапикселей.')
+        self.assertFalse(Post.objects.exists())
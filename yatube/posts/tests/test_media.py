@@ -0,0 +1,180 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.models import StoredFile
+from core.storage import content_hash, is_content_addressed
+from ..models import Post
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (b'\x47\x49\x46\x38\x39\x61\x02\x00'
+             b'\x01\x00\x80\x00\x00\x00\x00\x00'
+             b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+             b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+             b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+             b'\x0A\x00\x3B')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedStorageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='NoName')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, name, content=SMALL_GIF):
+        return Post.objects.create(
+            text='Тестовый пост', author=self.user,
+            image=SimpleUploadedFile(name, content, 'image/gif'))
+
+    def test_same_content_stored_once(self):
+        """Одинаковые загрузки хранятся одним файлом с именем по хешу."""
+        first = self.create_post('first.gif')
+        second = self.create_post('second.gif')
+        self.assertTrue(is_content_addressed(first.image.name))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(StoredFile.objects.get(
+            name=first.image.name).references, 2)
+        self.assertNotEqual(
+            self.create_post('other.gif', SMALL_GIF + b'\0').image.name,
+            first.image.name)
+
+    def test_file_deleted_without_references(self):
+        """Файл удаляется, когда на него не ссылается ни одна запись."""
+        first = self.create_post('first.gif', SMALL_GIF + b'\1')
+        second = self.create_post('second.gif', SMALL_GIF + b'\1')
+        name = first.image.name
+        with mock.patch(
+                'django.db.transaction.on_commit', lambda func: func()):
+            first.delete()
+            self.assertTrue(default_storage.exists(name))
+            second.delete()
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(StoredFile.objects.filter(name=name).exists())
+
+    def test_save_reserves_row_before_checking_file(self):
+        """Загрузка блокирует строку файла до проверки его наличия."""
+        name = self.create_post('first.gif', SMALL_GIF + b'\3').image.name
+        path, exists = default_storage.path(name), os.path.exists
+        checked = []
+
+        def check(checked_path):
+            if checked_path == path:
+                checked.append([query['sql'] for query in queries])
+            return exists(checked_path)
+
+        with CaptureQueriesContext(connection) as queries, \
+                mock.patch('core.storage.os.path.exists', check):
+            default_storage.save(
+                'posts/second.gif', ContentFile(SMALL_GIF + b'\3'))
+        self.assertTrue(any(
+            sql.startswith('UPDATE "core_storedfile"')
+            for sql in checked[0]))
+
+    def test_dedupe_media(self):
+        """Команда переносит старые файлы и сливает одинаковые."""
+        for name, content in (('posts/a.gif', SMALL_GIF),
+                              ('posts/b.gif', SMALL_GIF),
+                              ('posts/c.gif', SMALL_GIF + b'\2')):
+            os.makedirs(os.path.dirname(default_storage.path(name)),
+                        exist_ok=True)
+            with open(default_storage.path(name), 'wb') as file_:
+                file_.write(content)
+            Post.objects.create(
+                text='Старая запись', author=self.user, image=name)
+        call_command('dedupe_media', stdout=StringIO())
+        names = list(Post.objects.order_by('pk').values_list(
+            'image', flat=True))
+        self.assertEqual(names[0], names[1])
+        self.assertNotEqual(names[0], names[2])
+        for name in names:
+            self.assertTrue(is_content_addressed(name))
+            self.assertTrue(default_storage.exists(name))
+        self.assertFalse(default_storage.exists('posts/a.gif'))
+        self.assertEqual(StoredFile.objects.get(
+            name=names[0]).references, 2)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, MEDIA_SERVE_MODE='python')
+class MediaServingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.name = default_storage.save(
+            'posts/small.gif', SimpleUploadedFile('small.gif', SMALL_GIF))
+        cls.url = reverse('media', kwargs={'path': cls.name})
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_file_response(self):
+        """Файл отдаётся целиком с валидаторами и immutable."""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), SMALL_GIF)
+        self.assertEqual(response['Content-Type'], 'image/gif')
+        self.assertEqual(response['Content-Length'], str(len(SMALL_GIF)))
+        self.assertEqual(
+            response['ETag'], f'"{content_hash(self.name)}"')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(self.client.get(
+            self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_range(self):
+        """Range отдаёт отрезок файла, If-Range с чужим ETag — весь."""
+        response = self.client.get(self.url, HTTP_RANGE='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(
+            b''.join(response.streaming_content), SMALL_GIF[2:6])
+        self.assertEqual(
+            response['Content-Range'], f'bytes 2-5/{len(SMALL_GIF)}')
+        self.assertEqual(b''.join(self.client.get(
+            self.url, HTTP_RANGE='bytes=-3').streaming_content),
+            SMALL_GIF[-3:])
+        self.assertEqual(self.client.get(
+            self.url, HTTP_RANGE='bytes=2-5',
+            HTTP_IF_RANGE='"other"').status_code, 200)
+        self.assertEqual(self.client.get(
+            self.url, HTTP_RANGE='bytes=1000-').status_code, 416)
+
+    def test_front_server_modes(self):
+        """В режимах фронт-сервера Django отдаёт только заголовок."""
+        with self.settings(MEDIA_SERVE_MODE='x-accel-redirect'):
+            response = self.client.get(self.url)
+        self.assertEqual(
+            response['X-Accel-Redirect'], f'/protected-media/{self.name}')
+        self.assertEqual(response['Content-Type'], 'image/gif')
+        self.assertEqual(response.content, b'')
+        with self.settings(MEDIA_SERVE_MODE='x-sendfile'):
+            response = self.client.get(self.url)
+        self.assertEqual(
+            response['X-Sendfile'], default_storage.path(self.name))
+
+    def test_not_found(self):
+        """Пути вне MEDIA_ROOT, скрытые файлы и каталоги не отдаются."""
+        for path in ('../manage.py', 'posts/.upload-tmp', 'posts',
+                     'posts/missing.gif'):
+            with self.subTest(path=path):
+                self.assertEqual(self.client.get(
+                    f'{settings.MEDIA_URL}{path}').status_code, 404)
@@ -1,11 +1,17 @@
 from math import ceil
+from unittest import mock
 from time import sleep
 
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.conf import settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.http import urlsafe_base64_encode
 
+from core.utils import FeedCounter, encode_cursor, page_window
 from ..models import Follow, Post, Group
 
 User = get_user_model()
@@ -119,3 +125,151 @@ class PostPagesTests(TestCase):
                 response = self.authorized_client.get(page)
                 self.assertEqual(
                     len(response.context['page_obj'].object_list), count)
+
+    def test_keyset_pages_walk_whole_feed(self):
+        """Переход по курсорам after/before проходит всю ленту
+        index, group, profile, index_follow без пропусков и повторов"""
+        test_page = (
+            (reverse('posts:index'), Post.objects.all()),
+            (reverse('posts:profile',
+                     kwargs={'username': self.user.username}),
+             self.user.posts.all()),
+            (reverse('posts:group_list',
+                     kwargs={'slug': self.group.slug}),
+             self.group.posts.all()),
+            (reverse('posts:follow_index'),
+             Post.objects.filter(author=self.user_second)))
+        for page, post_list in test_page:
+            with self.subTest(page=page):
+                expected = list(post_list.order_by('-pub_date', '-id'))
+                response = self.authorized_client.get(page)
+                pages = [list(response.context['page_obj'])]
+                cursor = response.context['page_obj'].next_cursor
+                while cursor:
+                    response = self.authorized_client.get(
+                        page, {'after': cursor})
+                    page_obj = response.context['page_obj']
+                    self.assertIsNone(page_obj.number)
+                    pages.append(list(page_obj))
+                    cursor = page_obj.next_cursor
+                self.assertEqual(sum(pages, []), expected)
+                if len(pages) > 2:
+                    response = self.authorized_client.get(
+                        page, {'before': page_obj.previous_cursor})
+                    self.assertEqual(
+                        list(response.context['page_obj']), pages[-2])
+
+    def test_keyset_page_with_broken_cursor(self):
+        """Некорректный курсор открывает первую страницу"""
+        huge_pk = urlsafe_base64_encode(
+            b'2020-01-01T00:00:00+00:00|99999999999999999999999')
+        for cursor in ('broken', huge_pk):
+            with self.subTest(cursor=cursor):
+                response = self.authorized_client.get(
+                    reverse('posts:index'), {'after': cursor})
+                page_obj = response.context['page_obj']
+                self.assertEqual(
+                    list(page_obj),
+                    list(Post.objects.order_by('-pub_date', '-id')[
+                        :settings.MAX_PAGE_AMOUNT]))
+                self.assertIsNone(page_obj.previous_cursor)
+
+    def test_first_page_without_count(self):
+        """Первая страница без номера строится по ключу без COUNT"""
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('posts:index'))
+        page_obj = response.context['page_obj']
+        self.assertIsNone(page_obj.number)
+        self.assertIsNotNone(page_obj.next_cursor)
+        self.assertFalse(any(
+            'COUNT(' in query['sql'] for query in context.captured_queries))
+        self.assertContains(response, f'?after={page_obj.next_cursor}')
+        self.assertNotContains(response, '?page=')
+
+    def test_before_cursor_near_first_page(self):
+        """Курсор before у начала ленты отдаёт ровно более новые записи"""
+        url = reverse('posts:index')
+        expected = list(Post.objects.order_by('-pub_date', '-id'))
+        response = self.client.get(url, {'after': encode_cursor(expected[2])})
+        page_obj = response.context['page_obj']
+        self.assertEqual(
+            list(page_obj), expected[3:3 + settings.MAX_PAGE_AMOUNT])
+        response = self.client.get(
+            url, {'before': page_obj.previous_cursor})
+        page_obj = response.context['page_obj']
+        self.assertEqual(list(page_obj), expected[:3])
+        self.assertIsNone(page_obj.previous_cursor)
+
+
+class FeedCounterTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='NoName')
+        for count_post in range(COUNT_POST_WITH_GROUP):
+            Post.objects.create(
+                text=f'Тестовый пост №{count_post}', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cached_count_is_invalidated_by_new_post(self):
+        """Кэшированное количество сбрасывается при создании записи"""
+        counter = FeedCounter(f'profile:{self.user.pk}', mode='cached')
+        self.assertEqual(
+            counter.count(self.user.posts.all()), COUNT_POST_WITH_GROUP)
+        with self.assertNumQueries(0):
+            counter.count(self.user.posts.all())
+        with mock.patch(
+                'django.db.transaction.on_commit', lambda func: func()):
+            Post.objects.create(text='Новый пост', author=self.user)
+        self.assertEqual(
+            counter.count(self.user.posts.all()), COUNT_POST_WITH_GROUP + 1)
+
+    @override_settings(FEED_COUNT_ESTIMATE_LIMIT=5)
+    def test_estimated_count_is_approximate_over_limit(self):
+        """Оценка количества ограничена и помечается как приблизительная"""
+        counter = FeedCounter('index', mode='estimated')
+        self.assertEqual(counter.count(Post.objects.all()), 5)
+        self.assertTrue(counter.approximate)
+        counter = FeedCounter('index', mode='estimated')
+        self.assertEqual(counter.count(Post.objects.none()), 0)
+        self.assertFalse(counter.approximate)
+
+    @override_settings(FEED_COUNT_ESTIMATE_LIMIT=10)
+    def test_pages_past_estimated_count(self):
+        """Номерные страницы за пределом оценки дают 404, а дальше
+        ленту листают курсоры"""
+        follower = User.objects.create_user(username='follower')
+        Follow.objects.create(user=follower, author=self.user)
+        self.client.force_login(follower)
+        url = reverse('posts:follow_index')
+        response = self.client.get(url, {'page': 1})
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.paginator.count, 10)
+        self.assertTrue(page_obj.paginator.count_is_approximate)
+        self.assertContains(response, f'?after={page_obj.next_cursor}')
+        self.assertEqual(
+            self.client.get(url, {'page': 2}).status_code, 404)
+        response = self.client.get(url, {'after': page_obj.next_cursor})
+        self.assertEqual(
+            len(response.context['page_obj']),
+            COUNT_POST_WITH_GROUP - 10)
+
+
+class PageWindowTests(TestCase):
+    def test_page_window(self):
+        """Окно пагинатора содержит края и соседей текущей страницы"""
+        cases = (
+            (1, 5, [1, 2, 3, 4, 5]),
+            (1, 50000, [1, 2, 3, None, 50000]),
+            (25000, 50000,
+             [1, None, 24998, 24999, 25000, 25001, 25002, None, 50000]),
+            (50000, 50000, [1, None, 49998, 49999, 50000]),
+            (4, 8, [1, 2, 3, 4, 5, 6, None, 8]),
+        )
+        for number, num_pages, expected in cases:
+            with self.subTest(number=number, num_pages=num_pages):
+                self.assertEqual(
+                    list(page_window(number, num_pages)), expected)
@@ -0,0 +1,80 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='NoName')
+        cls.author = User.objects.create_user(username='Author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_group',
+            description='Тестовое описание группы')
+        for number in range(15):
+            cls.post = Post.objects.create(
+                text=f'Тестовый пост №{number}',
+                author=cls.author,
+                group=cls.group)
+        Comment.objects.create(
+            post=cls.post, author=cls.user, text='Комментарий')
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def query_plan(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def test_feed_queries_do_not_sort_full_scans(self):
+        """Запросы лент не сортируют полный проход по таблице"""
+        response = self.authorized_client.get(reverse('posts:index'))
+        cursor = response.context['page_obj'].next_cursor
+        test_page = (
+            (reverse('posts:index'), {}),
+            (reverse('posts:index'), {'page': 2}),
+            (reverse('posts:index'), {'after': cursor}),
+            (reverse('posts:group_list',
+                     kwargs={'slug': self.group.slug}), {'after': cursor}),
+            (reverse('posts:profile',
+                     kwargs={'username': self.author.username}),
+             {'after': cursor}),
+            (reverse('posts:follow_index'), {'after': cursor}),
+            (reverse('posts:post_detail',
+                     kwargs={'post_id': self.post.id}), {}),
+            (reverse('posts:profile_follow',
+                     kwargs={'username': self.author.username}), {}),
+        )
+        for page, query in test_page:
+            with self.subTest(page=page, query=query):
+                with CaptureQueriesContext(connection) as queries:
+                    self.authorized_client.get(page, query)
+                for captured in queries:
+                    if not captured['sql'].startswith('SELECT'):
+                        continue
+                    plan = self.query_plan(captured['sql'])
+                    full_scan = any(
+                        step.startswith('SCAN') and 'USING' not in step
+                        for step in plan)
+                    temp_sort = any('TEMP B-TREE' in step for step in plan)
+                    self.assertFalse(
+                        full_scan and temp_sort, f'{captured["sql"]}\n{plan}')
+
+    def test_posts_by_image_use_index(self):
+        """Поиск записей по имени картинки идёт по индексу"""
+        queryset = Post.objects.filter(image='posts/image.gif').only(
+            'author_id', 'group_id')
+        plan = self.query_plan(*queryset.query.sql_with_params())
+        self.assertTrue(
+            any('post_image_idx' in step for step in plan), plan)
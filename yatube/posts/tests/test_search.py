@@ -0,0 +1,114 @@
+from importlib import import_module
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Group, Post
+from ..search import TABLE, SearchResults, match_expression
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='writer', first_name='Лев', last_name='Толстой')
+        cls.group = Group.objects.create(
+            title='Путешествия', slug='travel', description='Описание')
+        cls.often = Post.objects.create(
+            author=cls.user,
+            text='Кошка ловит мышь, кошка спит, кошка ест.')
+        cls.once = Post.objects.create(
+            author=cls.user, group=cls.group,
+            text='Собака и кошка гуляют в парке.')
+        cls.other = Post.objects.create(
+            author=cls.user, text='Погода сегодня <b>хорошая</b>.')
+
+    def search(self, query):
+        return list(SearchResults(query)[:10])
+
+    def test_match_expression(self):
+        """Слова запроса становятся префиксами, синтаксис FTS5 отброшен."""
+        self.assertEqual(
+            match_expression('кош* OR "мышь'), '"кош"* "OR"* "мышь"*')
+        self.assertIsNone(match_expression(' "*() '))
+
+    def test_ranked_results(self):
+        """Результаты упорядочены по релевантности, слова выделены."""
+        results = self.search('кошка')
+        self.assertEqual(results, [self.often, self.once])
+        self.assertIn('<mark>Кошка</mark>', results[0].snippet)
+        self.assertEqual(self.search('кош мыш'), [self.often])
+
+    def test_author_and_group(self):
+        """Запись находится по имени автора и названию группы."""
+        self.assertEqual(len(self.search('толстой')), 3)
+        self.assertEqual(self.search('путешеств'), [self.once])
+
+    def test_index_follows_changes(self):
+        """Триггеры обновляют индекс при правке, удалении и
+        переименовании группы."""
+        Post.objects.filter(pk=self.other.pk).update(text='Дождливый день')
+        self.assertEqual(self.search('дождливый'), [self.other])
+        self.assertEqual(self.search('погода'), [])
+        self.group.title = 'Прогулки'
+        self.group.save()
+        self.assertEqual(self.search('прогулки'), [self.once])
+        Post.objects.filter(pk=self.once.pk).delete()
+        self.assertEqual(self.search('собака'), [])
+
+    def test_snippet_escaped(self):
+        """Текст записи в фрагменте экранируется."""
+        snippet = self.search('погода')[0].snippet
+        self.assertIn('&lt;b&gt;', snippet)
+        self.assertNotIn('<b>', snippet)
+
+    def test_search_page(self):
+        """Страница поиска показывает найденные записи."""
+        response = self.client.get(reverse('posts:search'), {'q': 'кошка'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(response.context['page_obj']), [self.often, self.once])
+        self.assertContains(response, '<mark>')
+        response = self.client.get(reverse('posts:search'), {'q': ''})
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    def test_admin_search(self):
+        """Поиск в админке идёт по индексу."""
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'собак'})
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.once])
+
+    def test_rebuild_command(self):
+        """Команда заменяет строки индекса пачками, не очищая его."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {TABLE} SET text = 'устарело' WHERE rowid = %s",
+                [self.often.pk])
+            cursor.execute(
+                f'INSERT INTO {TABLE}(rowid, text, author, group_title) '
+                f"VALUES (%s, 'кошка удалённой записи', '', '')",
+                [self.other.pk + 1])
+        call_command(
+            'rebuild_search_index', batch_size=2, stdout=StringIO())
+        self.assertEqual(self.search('кошка'), [self.often, self.once])
+        self.assertEqual(self.search('устарело'), [])
+        self.assertEqual(SearchResults('кошка').count(), 2)
+
+    def test_migration_indexes_existing_posts(self):
+        """Миграция индексирует записи, созданные до неё."""
+        migration = import_module('posts.migrations.0020_post_search')
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE}')
+            cursor.execute(migration.POPULATE)
+        self.assertEqual(self.search('кошка'), [self.often, self.once])
+        self.assertEqual(self.search('путешеств'), [self.once])
@@ -0,0 +1,64 @@
+import gzip
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+from core.storage import CompressedManifestStaticFilesStorage
+
+TEMP_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SOURCE_DIR = os.path.join(TEMP_DIR, 'source')
+STATIC_ROOT = os.path.join(TEMP_DIR, 'static')
+CSS = b'body { background: url("../img/logo.png"); }\n' * 50
+
+
+@override_settings(
+    STATICFILES_DIRS=[SOURCE_DIR], STATIC_ROOT=STATIC_ROOT,
+    STATICFILES_STORAGE='core.storage.CompressedManifestStaticFilesStorage')
+class StaticFilesStorageTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for name, content in (('css/site.css', CSS),
+                              ('img/logo.png', b'\x89PNG')):
+            path = os.path.join(SOURCE_DIR, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file_:
+                file_.write(content)
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+
+    def test_hashed_and_compressed(self):
+        """collectstatic пишет файлы с хешем и сжатые копии текста."""
+        storage = CompressedManifestStaticFilesStorage()
+        name = storage.stored_name('css/site.css')
+        self.assertRegex(name, r'^css/site\.[0-9a-f]{12}\.css$')
+        with storage.open(name) as css, storage.open(f'{name}.gz') as gz:
+            self.assertEqual(gzip.decompress(gz.read()), css.read())
+        self.assertFalse(storage.exists(
+            f'{storage.stored_name("img/logo.png")}.gz'))
+
+    def test_url_resolved_once(self):
+        """URL из манифеста вычисляется один раз на процесс."""
+        storage = CompressedManifestStaticFilesStorage()
+        with mock.patch.object(
+                CompressedManifestStaticFilesStorage, 'stored_name',
+                wraps=storage.stored_name) as stored_name_mock:
+            url = storage.url('css/site.css')
+            self.assertEqual(storage.url('css/site.css'), url)
+        self.assertEqual(stored_name_mock.call_count, 1)
+        self.assertEqual(
+            url, f'{settings.STATIC_URL}{storage.stored_name("css/site.css")}')
+
+    def test_missing_file_rejected(self):
+        """Имя вне манифеста — ошибка, а не URL без хеша."""
+        with self.assertRaises(ValueError):
+            CompressedManifestStaticFilesStorage().url('css/missing.css')
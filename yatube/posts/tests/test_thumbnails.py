@@ -0,0 +1,176 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from sorl.thumbnail import default
+
+from core.thumbnails import LOCK_DIRECTORY, _failed, _file_lock, pregenerate
+from ..models import Post
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (b'\x47\x49\x46\x38\x39\x61\x02\x00'
+             b'\x01\x00\x80\x00\x00\x00\x00\x00'
+             b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+             b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+             b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+             b'\x0A\x00\x3B')
+PLACEHOLDER = 'bg-light'
+THUMBNAIL = '<img class="card-img my-2 h-auto"'
+
+
+def cached_thumbnail(post):
+    geometry, options = settings.THUMBNAIL_PRESETS['article']
+    return default.backend.get_cached_thumbnail(
+        post.image, geometry, **options)
+
+
+# Пресет в размер исходника: масштабирование sorl 12.7 не работает
+# с Pillow 10, а конвейер от размера миниатюры не зависит.
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0,
+    THUMBNAIL_PRESETS={
+        'article': ('2x1', {'crop': 'center', 'upscale': False}),
+        'detail': ('2', {'upscale': False})},
+    THUMBNAIL_SRCSET_WIDTHS=(2, 4))
+class ThumbnailPregenerationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='NoName')
+        cls.post = Post.objects.create(
+            text='Тестовый пост', author=cls.user,
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'))
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_placeholder_until_ready(self):
+        """Пока миниатюры нет, выводится заглушка, затем картинка."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        response = self.authorized_client.get(url)
+        self.assertContains(response, PLACEHOLDER)
+        self.assertNotContains(response, THUMBNAIL)
+        with mock.patch(
+                'django.db.transaction.on_commit', lambda func: func()):
+            pregenerate(self.post.image.name)
+        self.assertIsNotNone(cached_thumbnail(self.post))
+        response = self.authorized_client.get(url)
+        self.assertContains(response, THUMBNAIL)
+        self.assertNotContains(response, PLACEHOLDER)
+
+    def test_post_create_pregenerates(self):
+        """После сохранения записи с картинкой миниатюры уже готовы."""
+        with mock.patch(
+                'django.db.transaction.on_commit', lambda func: func()):
+            self.authorized_client.post(reverse('posts:post_create'), {
+                'text': 'Новая запись',
+                'image': SimpleUploadedFile(
+                    'new.gif', SMALL_GIF, 'image/gif'),
+            })
+        post = Post.objects.get(text='Новая запись')
+        self.assertIsNotNone(cached_thumbnail(post))
+
+    def test_missing_source_not_retried(self):
+        """Недоступный исходник не ставится в очередь повторно."""
+        post = Post.objects.create(
+            text='Без файла', author=self.user, image='posts/missing.jpg')
+        pregenerate(post.image.name)
+        self.assertIsNone(cached_thumbnail(post))
+        with mock.patch('core.thumbnails.pregenerate') as pregenerate_mock, \
+                mock.patch('django.db.transaction.on_commit',
+                           lambda func: func()):
+            self.assertContains(self.authorized_client.get(reverse(
+                'posts:post_detail', kwargs={'post_id': post.pk})),
+                PLACEHOLDER)
+        pregenerate_mock.assert_not_called()
+
+    def test_page_thumbnails_prefetched(self):
+        """Миниатюры ленты читаются из KV-хранилища одним запросом."""
+        for number in range(3):
+            post = Post.objects.create(
+                text=f'Запись {number}', author=self.user,
+                image=SimpleUploadedFile(
+                    f'small_{number}.gif', SMALL_GIF + bytes([number]),
+                    'image/gif'))
+            pregenerate(post.image.name)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(reverse('posts:index'))
+        self.assertEqual(len([
+            query for query in queries
+            if 'thumbnail_kvstore' in query['sql']]), 1)
+        self.assertContains(response, THUMBNAIL, count=3)
+
+    def test_single_flight(self):
+        """Пока миниатюру создаёт другой процесс, она не создаётся снова."""
+        geometry, options = settings.THUMBNAIL_PRESETS['article']
+        thumbnail = default.backend._thumbnail_file(
+            self.post.image, geometry, dict(options))
+        with _file_lock(thumbnail.key) as acquired, mock.patch.object(
+                default.engine, 'get_image') as get_image_mock:
+            self.assertTrue(acquired)
+            pregenerate(self.post.image.name)
+        get_image_mock.assert_not_called()
+        self.assertIsNone(cached_thumbnail(self.post))
+        self.assertNotIn(self.post.image.name, _failed)
+        pregenerate(self.post.image.name)
+        self.assertIsNotNone(cached_thumbnail(self.post))
+
+    @override_settings(THUMBNAIL_LOCK_FILES=4)
+    def test_lock_files_bounded(self):
+        """Файлов блокировок не больше THUMBNAIL_LOCK_FILES."""
+        for number in range(20):
+            with _file_lock(f'key{number}') as acquired:
+                self.assertTrue(acquired)
+        self.assertLessEqual(len(os.listdir(os.path.join(
+            settings.MEDIA_ROOT, LOCK_DIRECTORY))), 4)
+
+    def test_image_size_stored(self):
+        """Размеры картинки сохраняются в записи без чтения файла."""
+        self.assertEqual(
+            (self.post.image_width, self.post.image_height), (2, 1))
+        missing = Post.objects.create(
+            text='Без файла', author=self.user, image='posts/missing.jpg')
+        with mock.patch('django.core.files.images.get_image_dimensions') \
+                as dimensions_mock:
+            post = Post.objects.get(pk=self.post.pk)
+            Post.objects.get(pk=missing.pk).image = 'posts/other.jpg'
+        dimensions_mock.assert_not_called()
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertIsNone(missing.image_width)
+
+    def test_srcset(self):
+        """Миниатюра выводится с srcset, размерами и ленивой загрузкой."""
+        pregenerate(self.post.image.name)
+        response = self.authorized_client.get(reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk}))
+        self.assertContains(response, 'width="2" height="1" loading="lazy"')
+        # Вариант шириной 4 шире исходника и в srcset не попадает.
+        self.assertRegex(
+            response.content.decode(), r'src="([^"]+)" srcset="\1 2w"')
+
+    def test_placeholder_size(self):
+        """Заглушка получает пропорции миниатюры из размеров записи."""
+        post = Post.objects.create(
+            text='Без файла', author=self.user, image='posts/missing.jpg',
+            image_width=4, image_height=2)
+        self.assertContains(self.authorized_client.get(reverse(
+            'posts:post_detail', kwargs={'post_id': post.pk})),
+            'aspect-ratio: 2 / 1')
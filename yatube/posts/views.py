@@ -1,80 +1,138 @@
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.shortcuts import get_object_or_404, render, redirect
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.shortcuts import render, redirect
 from django.db.models.query import Prefetch
-
-from core.utils import paginator
-from .models import Post, Group, Follow, Comment, User
+from django.template.response import TemplateResponse
+
+from core.thumbnails import pregenerate
+from core.uploads import truncated_uploads
+from core.utils import FeedCounter, paginator
+from . import counters, feeds, lookups
+from .conditions import (
+    conditional_page, follow_scope, group_scope, index_scope, post_scope,
+    profile_scope)
+from .models import Post, Follow, Comment
 from .forms import PostForm, CommentForm
+from .search import SearchResults
 
 
+@conditional_page(index_scope)
 def index(request):
     post_list = Post.objects.select_related('group', 'author')
     context = {
-        'page_obj': paginator(request.GET.get('page'), post_list),
+        'page_obj': paginator(request.GET, post_list, 'index'),
+        'cache_tags': ['feed:all'],
     }
-    return render(request, 'posts/index.html', context)
+    return TemplateResponse(request, 'posts/index.html', context)
 
 
+@conditional_page(group_scope)
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
+    group = lookups.groups.get_or_404(slug)
     post_list = group.posts.select_related('author')
     context = {
         'group': group,
-        'page_obj': paginator(request.GET.get('page'), post_list),
+        'page_obj': paginator(
+            request.GET, post_list, f'group_list:{group.pk}',
+            count=lambda: group.posts_count),
+        'cache_tags': [f'group:{group.pk}'],
     }
-    return render(request, 'posts/group_list.html', context)
+    return TemplateResponse(request, 'posts/group_list.html', context)
 
 
+@conditional_page(profile_scope)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = lookups.users.get_or_404(username)
+    author_counters = counters.user_counter(author)
     post_list = author.posts.select_related('group')
     following = request.user.is_authenticated and author.following.exists()
+    count_key = f'profile:{author.pk}'
+    page_obj = None
+    if settings.FOLLOW_FEED_ENGINE == 'timeline' and not request.GET:
+        page_obj = feeds.timeline_page(
+            [author.pk], 1, post_list,
+            FeedCounter(count_key, value=author_counters.posts_count))
     context = {
-        'page_obj': paginator(request.GET.get('page'), post_list),
+        'page_obj': page_obj or paginator(
+            request.GET, post_list, count_key,
+            count=author_counters.posts_count),
         'author': author,
-        'following': following
+        'counters': author_counters,
+        'following': following,
+        'cache_tags': [f'author:{author.pk}', f'profile:{author.pk}'],
     }
-    return render(request, 'posts/profile.html', context)
+    return TemplateResponse(request, 'posts/profile.html', context)
 
 
+@conditional_page(post_scope)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post.objects.select_related(
-        'group', 'author').prefetch_related(
+    post = lookups.get_post_or_404(Post.objects.select_related(
+        'group', 'author__counters').prefetch_related(
             Prefetch(
                 'comments',
                 queryset=Comment.objects.select_related(
-                    'author'))), id=post_id)
-    count = post.author.posts.count()
+                    'author'))), post_id)
+    count = counters.user_counter(post.author).posts_count
     context = {
         'post': post,
         'count': count,
         'form': CommentForm(),
+        'cache_tags': [
+            f'post:{post.pk}', f'author:{post.author_id}',
+            f'group:{post.group_id}'],
+    }
+    return TemplateResponse(request, 'posts/post_detail.html', context)
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    results = SearchResults(
+        query, Post.objects.select_related('author', 'group'))
+    context = {
+        'query': query,
+        'page_obj': Paginator(
+            results, settings.MAX_PAGE_AMOUNT).get_page(
+                request.GET.get('page')),
     }
-    return render(request, 'posts/post_detail.html', context)
+    return render(request, 'posts/search.html', context)
 
 
 @login_required
+@transaction.atomic
 def post_create(request):
     form = PostForm(request.POST or None,
-                    files=request.FILES or None)
+                    files=request.FILES or None,
+                    truncated=truncated_uploads(request))
     if form.is_valid():
         new_post = form.save(commit=False)
         new_post.author = request.user
         new_post.save()
+        if new_post.image:
+            transaction.on_commit(lambda: pregenerate(new_post.image.name))
         return redirect('posts:profile', request.user)
     return render(request, 'posts/form_post.html', {'form': form})
 
 
 @login_required
+@transaction.atomic
 def post_edit(request, post_id):
-    post = get_object_or_404(Post.objects.select_related('group', 'author'),
-                             id=post_id)
+    post = lookups.get_post_or_404(
+        Post.objects.select_related('group', 'author'), post_id)
     if request.user == post.author:
         form = PostForm(request.POST or None,
                         files=request.FILES or None,
+                        truncated=truncated_uploads(request),
                         instance=post)
         if form.is_valid():
-            form.save()
+            post = form.save(commit=False)
+            update_fields = list(PostForm.Meta.fields)
+            if 'image' in form.changed_data:
+                update_fields += ['image_width', 'image_height']
+            post.save(update_fields=update_fields)
+            if 'image' in form.changed_data and post.image:
+                transaction.on_commit(lambda: pregenerate(post.image.name))
             return redirect('posts:post_detail', post_id)
         context = {
             'form': form,
@@ -85,8 +143,9 @@ def post_edit(request, post_id):
 
 
 @login_required
+@transaction.atomic
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = lookups.get_post_or_404(Post.objects, post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
@@ -97,17 +156,18 @@ def add_comment(request, post_id):
 
 
 @login_required
+@conditional_page(follow_scope)
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
     context = {
-        'page_obj': paginator(request.GET.get('page'), post_list),
+        'page_obj': feeds.follow_page(request.user, request.GET),
     }
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
-    author = get_object_or_404(User, username=username)
+    author = lookups.users.get_or_404(username)
     if request.user != author:
         Follow.objects.get_or_create(
             user=request.user,
@@ -116,7 +176,8 @@ def profile_follow(request, username):
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
-    author = get_object_or_404(User, username=username)
+    author = lookups.users.get_or_404(username)
     Follow.objects.filter(author=author, user=request.user).delete()
     return redirect('posts:profile', username=username)
@@ -50,6 +50,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.AnonymousPageCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -93,6 +94,30 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+
+# Tag versions, pages, fragments and timelines must be seen by every
+# worker: a signal bumps tags only in the process that handled the write,
+# so a per-process LocMemCache would serve stale pages for a whole TTL.
+# The file cache is shared by the workers of one host; with several
+# hosts switch both aliases to memcached or redis.
+CACHE_DIR = os.path.join(BASE_DIR, 'cache')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(CACHE_DIR, 'default'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'follow_feed': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(CACHE_DIR, 'follow_feed'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -132,6 +157,13 @@ USE_TZ = True
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 STATIC_URL = '/static/'
 # STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
+# collectstatic writes content-hashed names and .gz (.br with the
+# optional brotli package) copies; serve STATIC_ROOT with far-future
+# expiry and precompressed variants
+STATICFILES_STORAGE = 'core.storage.CompressedManifestStaticFilesStorage'
+
+# Settings tests: static files are served without the manifest
+TEST_RUNNER = 'core.test_runner.TestRunner'
 
 # Settings Login
 LOGIN_URL = 'users:login'
@@ -145,12 +177,89 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 MAX_PAGE_AMOUNT = 10
 
+# Settings feed counters: exact, cached, estimated or counter
+FEED_COUNT_MODES = {
+    'index': 'cached',
+    'group_list': 'counter',
+    'profile': 'counter',
+    'follow_index': 'estimated',
+}
+FEED_COUNT_TIMEOUT = 60 * 15
+FEED_COUNT_ESTIMATE_LIMIT = 1000
+
+# Settings admin changelists: rows counted, or up to a few pages past
+# the current one if that is further; a capped count is shown as "N+"
+ADMIN_COUNT_LIMIT = 10000
+
+# Settings admin bulk actions: rows per UPDATE/DELETE statement
+BULK_BATCH_SIZE = 1000
+
+# Settings follow feed: inbox, timeline or orm
+FOLLOW_FEED_ENGINE = 'inbox'
+FEED_BATCH_SIZE = 500
+TIMELINE_LENGTH = 200
+TIMELINE_TIMEOUT = 60 * 60 * 24
+
+# Settings per-user fragment cache
+USER_CACHE_MAX_ENTRIES = 20
+USER_CACHE_MAX_BYTES = 256 * 1024
+USER_CACHE_TIMEOUT = 60 * 60
+
+# Settings anonymous full-page cache
+PAGE_CACHE_VIEWS = (
+    'posts:index',
+    'posts:group_list',
+    'posts:profile',
+    'posts:post_detail',
+)
+PAGE_CACHE_TIMEOUT = 60 * 5
+
+# Settings per-post fragment cache
+POST_FRAGMENT_TIMEOUT = 60 * 60
+
+# Settings Group/User lookup cache
+OBJECT_CACHE_LOCAL_SIZE = 256
+OBJECT_CACHE_LOCAL_TIMEOUT = 5
+OBJECT_CACHE_TIMEOUT = 60 * 60
+NEGATIVE_CACHE_TIMEOUT = 60
+
+# Settings thumbnails: presets used in templates and pregeneration pool
+THUMBNAIL_BACKEND = 'core.thumbnails.ThumbnailBackend'
+THUMBNAIL_KVSTORE = 'core.thumbnails.KVStore'
+THUMBNAIL_PRESETS = {
+    'article': ('960x339', {'crop': 'center', 'upscale': True}),
+    'detail': ('960', {'upscale': False}),
+}
+THUMBNAIL_SRCSET_WIDTHS = (480, 960, 1440)
+THUMBNAIL_WORKERS = 2
+# generation lock files under MEDIA_ROOT/.thumbnail-locks, shared by keys
+THUMBNAIL_LOCK_FILES = 256
+
 # Settings 403 error
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 # Settings media
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Uploads are stored by content hash and deduplicated; thumbnails keep
+# the names sorl gives them
+DEFAULT_FILE_STORAGE = 'core.storage.ContentAddressedStorage'
+THUMBNAIL_STORAGE = 'django.core.files.storage.FileSystemStorage'
+
+# Settings media serving: 'x-accel-redirect' (nginx, internal location
+# at MEDIA_ACCEL_PREFIX aliased to MEDIA_ROOT), 'x-sendfile' (Apache,
+# lighttpd) or 'python' (FileResponse, for development and benchmarks)
+MEDIA_SERVE_MODE = 'python'
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+MEDIA_CACHE_MAX_AGE = 60 * 60
+
+# Settings image uploads: streamed to a temporary file, checked
+# and re-encoded to WebP before saving
+FILE_UPLOAD_HANDLERS = ['core.uploads.LimitedTemporaryFileUploadHandler']
+IMAGE_UPLOAD_MAX_BYTES = 15 * 1024 * 1024
+IMAGE_UPLOAD_MAX_PIXELS = 50 * 10 ** 6
+IMAGE_UPLOAD_MAX_SIDE = 1920
+IMAGE_UPLOAD_QUALITY = 85
 
 # Settings IP
 INTERNAL_IPS = [
@@ -14,24 +14,27 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from core.views import object_cache_stats, serve_media
+
 handler404 = 'core.views.page_not_found'
 handler403 = 'core.views.csrf_failure'
 handler500 = 'core.views.fail_500'
 
 urlpatterns = [
+    path('admin/cache-stats/', object_cache_stats,
+         name='object_cache_stats'),
     path('admin/', admin.site.urls),
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
     path('', include('posts.urls', namespace='posts')),
     path('about/', include('about.urls', namespace='about')),
+    path(f'{settings.MEDIA_URL.lstrip("/")}<path:path>', serve_media,
+         name='media'),
 ]
 
 if settings.DEBUG:
     import debug_toolbar
-    urlpatterns += static(
-        settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
     urlpatterns += (path('__debug__/', include(debug_toolbar.urls)),)